@@ -14,7 +14,10 @@ DATA_DIR.mkdir(exist_ok=True)
 MODELS_DIR.mkdir(exist_ok=True)
 LOGS_DIR.mkdir(exist_ok=True)
 
-# CSV file paths
+# SQLite database file (all tables live here)
+DB_FILE = str(DATA_DIR / "safehorizon.db")
+
+# CSV file paths (table identifiers; imported into the database on first run)
 CSV_FILES = {
     "tourists": str(DATA_DIR / "tourists.csv"),
     "locations": str(DATA_DIR / "locations.csv"), 
@@ -22,6 +25,12 @@ CSV_FILES = {
     "geofences": str(DATA_DIR / "geofences.csv")
 }
 
+# Write buffer configuration (rows are flushed in batches)
+BUFFER_CONFIG = {
+    "batch_size": 100,  # Flush a file once this many rows are pending
+    "max_delay_ms": 50  # Flush pending rows at least this often
+}
+
 # Model file paths
 MODEL_FILE = str(MODELS_DIR / "anomaly_model.pkl")
 SCALER_FILE = str(MODELS_DIR / "scaler.pkl")
@@ -47,7 +56,9 @@ CORS_CONFIG = {
 ML_CONFIG = {
     "contamination": 0.1,
     "random_state": 42,
-    "retrain_interval": 50  # Retrain every N new locations
+    "retrain_interval": 50,  # Retrain every N new locations
+    "batch_size": 128,  # Score at most this many concurrent predictions per model call
+    "batch_wait_ms": 5  # Wait at most this long for more predictions to join a batch
 }
 
 # Logging Configuration
@@ -1,42 +1,60 @@
+import asyncio
 import uuid
+from dataclasses import fields
 from datetime import datetime
 from contextlib import asynccontextmanager
 from typing import Optional
 
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
 
 # Import custom modules
 from src.models import (
     TouristRegistration, LocationData, AlertCreate, AlertUpdate, GeofenceData,
     TouristResponse, LocationResponse, AlertResponse, MLStatusResponse, MLAnalysis,
     ComprehensiveTouristInfo, TouristSummary, AllTouristsResponse, LocationInfo, AlertInfo, 
-    TouristAnalytics, TouristSafetyStatus
+    TouristAnalytics, TouristSafetyStatus, ORJSONResponse
 )
 from src.database import (
-    init_csv_files, read_csv_safe, append_to_csv, update_csv_row, safe_json_convert
+    init_csv_files, read_csv_safe, read_rows_where, append_to_csv, update_csv_row, safe_json_convert,
+    write_buffer, now_isoformat, optional_text
+)
+from src.geofencing import check_geofences, init_geofence_index, update_geofence_index
+from src.ml_engine import (
+    load_or_train_model, train_anomaly_model, force_retrain, get_ml_status,
+    stop_auto_retrain, shutdown_trainer, observe_location, observe_alert, prediction_batcher
+)
+from src.tourist_analytics import (
+    get_tourist_analytics, get_safety_status, summarize_all_tourists,
+    load_tourist_aggregates, store_location
 )
-from src.geofencing import check_geofences
-from src.ml_engine import load_or_train_model, predict_anomaly, train_anomaly_model, force_retrain, get_ml_status, stop_auto_retrain_monitor
-from src.tourist_analytics import get_tourist_analytics, get_safety_status
 from config.settings import CSV_FILES, API_CONFIG, CORS_CONFIG, ML_CONFIG
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     init_csv_files()
+    write_buffer.start()
+    init_geofence_index()
     load_or_train_model()
+    load_tourist_aggregates()
+    prediction_batcher.start()
     print("✅ SafeHorizon API started successfully with auto-retraining enabled")
     yield
     # Shutdown
-    stop_auto_retrain_monitor()
+    await prediction_batcher.stop()
+    await write_buffer.stop()
+    stop_auto_retrain()
+    shutdown_trainer()
     print("⏹️ SafeHorizon API shutting down")
 
 # Initialize FastAPI app with lifespan
 app = FastAPI(
     title=API_CONFIG["title"], 
     version=API_CONFIG["version"], 
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS configuration
@@ -48,6 +66,10 @@ app.add_middleware(
     allow_headers=CORS_CONFIG["allow_headers"],
 )
 
+def model_json_response(model: BaseModel) -> Response:
+    """Serialize a (large, nested) response model to JSON in a single pydantic-core call"""
+    return Response(content=model.model_dump_json(), media_type="application/json")
+
 # API Endpoints
 
 @app.post("/register", response_model=TouristResponse)
@@ -63,7 +85,7 @@ async def register_tourist(tourist: TouristRegistration):
         "trip_end": tourist.trip_end
     }
     
-    if append_to_csv(CSV_FILES["tourists"], tourist_data):
+    if await asyncio.to_thread(append_to_csv, CSV_FILES["tourists"], tourist_data):
         return TouristResponse(tourist_id=tourist_id)
     else:
         raise HTTPException(
@@ -75,14 +97,14 @@ async def register_tourist(tourist: TouristRegistration):
 async def submit_location(location: LocationData):
     """Submit location data with geofence and anomaly checking"""
     location_id = str(uuid.uuid4())
-    timestamp = datetime.now().isoformat()
+    timestamp = now_isoformat()
     
     # Check geofences
-    geofence_alert = check_geofences(location.lat, location.lon)
+    geofence_alert = await asyncio.to_thread(check_geofences, location.lat, location.lon)
     in_geofence = 1 if geofence_alert else 0
     
     # Check for anomaly with enhanced prediction
-    ml_result = predict_anomaly(
+    ml_result = await prediction_batcher.submit(
         location.speed_kmh or 0.0, 
         in_geofence, 
         location.lat, 
@@ -101,7 +123,10 @@ async def submit_location(location: LocationData):
         "label": "anomaly" if ml_result["is_anomaly"] else "normal"
     }
     
-    append_to_csv(CSV_FILES["locations"], location_data)
+    # Stored together with the tourist's running aggregates, off the event loop
+    if await asyncio.to_thread(store_location, location_data):
+        # May extract features for a background retrain, so keep it off the event loop
+        await asyncio.to_thread(observe_location, location_data)
     
     alert_created = False
     
@@ -117,7 +142,8 @@ async def submit_location(location: LocationData):
             "created_at": timestamp,
             "related_location_id": location_id
         }
-        append_to_csv(CSV_FILES["alerts"], alert_data)
+        if await asyncio.to_thread(append_to_csv, CSV_FILES["alerts"], alert_data):
+            observe_alert(alert_data)
         alert_created = True
     
     # Create ML anomaly alert if needed (only for high-confidence anomalies)
@@ -132,10 +158,11 @@ async def submit_location(location: LocationData):
             "created_at": timestamp,
             "related_location_id": location_id
         }
-        append_to_csv(CSV_FILES["alerts"], alert_data)
+        if await asyncio.to_thread(append_to_csv, CSV_FILES["alerts"], alert_data):
+            observe_alert(alert_data)
         alert_created = True
     
-    return LocationResponse(
+    return ORJSONResponse(LocationResponse(
         status="OK", 
         alert_created=alert_created,
         ml_analysis=MLAnalysis(
@@ -143,13 +170,13 @@ async def submit_location(location: LocationData):
             confidence=float(ml_result["confidence"]),
             score=float(ml_result["score"])
         )
-    )
+    ))
 
 @app.post("/alert/sos", response_model=AlertResponse)
 async def create_sos_alert(alert: AlertCreate):
     """Create an SOS alert"""
     alert_id = str(uuid.uuid4())
-    timestamp = datetime.now().isoformat()
+    timestamp = now_isoformat()
     
     alert_data = {
         "id": alert_id,
@@ -162,8 +189,9 @@ async def create_sos_alert(alert: AlertCreate):
         "related_location_id": ""
     }
     
-    if append_to_csv(CSV_FILES["alerts"], alert_data):
-        return AlertResponse(alert_id=alert_id, status="OPEN")
+    if await asyncio.to_thread(append_to_csv, CSV_FILES["alerts"], alert_data):
+        observe_alert(alert_data)
+        return ORJSONResponse(AlertResponse(alert_id=alert_id, status="OPEN"))
     else:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -173,13 +201,13 @@ async def create_sos_alert(alert: AlertCreate):
 @app.get("/alerts")
 async def get_alerts():
     """Get all alerts"""
-    alerts_df = read_csv_safe(CSV_FILES["alerts"])
+    alerts_df = await asyncio.to_thread(read_csv_safe, CSV_FILES["alerts"])
     return safe_json_convert(alerts_df)
 
 @app.patch("/alerts/{alert_id}")
 async def update_alert(alert_id: str, alert_update: AlertUpdate):
     """Update alert status"""
-    if update_csv_row(CSV_FILES["alerts"], alert_id, {"status": alert_update.status}):
+    if await asyncio.to_thread(update_csv_row, CSV_FILES["alerts"], alert_id, {"status": alert_update.status}):
         return {"message": "Alert updated successfully"}
     else:
         raise HTTPException(
@@ -190,30 +218,16 @@ async def update_alert(alert_id: str, alert_update: AlertUpdate):
 @app.get("/heatmap")
 async def get_heatmap():
     """Get heatmap data with safe and danger zones"""
-    locations_df = read_csv_safe(CSV_FILES["locations"])
-    alerts_df = read_csv_safe(CSV_FILES["alerts"])
+    locations_df = await asyncio.to_thread(read_csv_safe, CSV_FILES["locations"])
+    alerts_df = await asyncio.to_thread(read_csv_safe, CSV_FILES["alerts"])
     
     # Get alert locations (danger zones)
-    danger_locations = []
-    for _, alert in alerts_df.iterrows():
-        danger_locations.append({
-            "lat": alert["lat"],
-            "lon": alert["lon"],
-            "type": alert["type"],
-            "tourist_id": alert["tourist_id"]
-        })
+    danger_locations = alerts_df[["lat", "lon", "type", "tourist_id"]].to_dict("records")
     
     # Get safe locations (exclude alert locations)
     alert_location_ids = set(alerts_df["related_location_id"].dropna())
-    safe_locations = []
-    
-    for _, location in locations_df.iterrows():
-        if location["id"] not in alert_location_ids:
-            safe_locations.append({
-                "lat": location["lat"],
-                "lon": location["lon"],
-                "tourist_id": location["tourist_id"]
-            })
+    safe_df = locations_df[~locations_df["id"].isin(alert_location_ids)]
+    safe_locations = safe_df[["lat", "lon", "tourist_id"]].to_dict("records")
     
     return {
         "safe": safe_locations,
@@ -223,13 +237,8 @@ async def get_heatmap():
 @app.get("/tourist/{tourist_id}")
 async def get_tourist_details(tourist_id: str):
     """Get tourist details and their alerts"""
-    import pandas as pd
-    
-    tourists_df = read_csv_safe(CSV_FILES["tourists"])
-    alerts_df = read_csv_safe(CSV_FILES["alerts"])
-    
     # Find tourist
-    tourist = tourists_df[tourists_df['id'] == tourist_id]
+    tourist = await asyncio.to_thread(read_rows_where, CSV_FILES["tourists"], "id", tourist_id)
     if tourist.empty:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -237,15 +246,10 @@ async def get_tourist_details(tourist_id: str):
         )
     
     # Get tourist's alerts and convert safely
-    tourist_alerts = alerts_df[alerts_df['tourist_id'] == tourist_id]
-    
-    # Convert tourist data safely
-    tourist_dict = tourist.iloc[0].to_dict()
-    # Replace NaN values in tourist dict
-    tourist_dict = {k: (None if pd.isna(v) else v) for k, v in tourist_dict.items()}
+    tourist_alerts = await asyncio.to_thread(read_rows_where, CSV_FILES["alerts"], "tourist_id", tourist_id)
     
     return {
-        "tourist": tourist_dict,
+        "tourist": safe_json_convert(tourist)[0],
         "alerts": safe_json_convert(tourist_alerts)
     }
 
@@ -263,7 +267,9 @@ async def create_geofence(geofence: GeofenceData):
         "severity": geofence.severity
     }
     
-    if append_to_csv(CSV_FILES["geofences"], geofence_data):
+    if await asyncio.to_thread(append_to_csv, CSV_FILES["geofences"], geofence_data):
+        # Index the coordinates directly rather than re-parsing the JSON just written
+        await asyncio.to_thread(update_geofence_index, {**geofence_data, "polygon": geofence.polygon})
         return {"geofence_id": geofence_id, "message": "Geofence created successfully"}
     else:
         raise HTTPException(
@@ -282,7 +288,7 @@ async def root():
 async def manual_retrain():
     """Manually trigger ML model retraining"""
     try:
-        success = force_retrain()
+        success = await force_retrain()
         if success:
             return {
                 "status": "success",
@@ -305,7 +311,10 @@ async def ml_status():
     """Get current ML model status and statistics"""
     try:
         status_data = get_ml_status()
-        return MLStatusResponse(**status_data)
+        # get_ml_status() reports extra fields the response doesn't include
+        return ORJSONResponse(MLStatusResponse(**{
+            field.name: status_data[field.name] for field in fields(MLStatusResponse)
+        }))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -321,7 +330,7 @@ async def test_ml_prediction(
 ):
     """Test ML prediction with custom parameters"""
     try:
-        result = predict_anomaly(speed_kmh, in_geofence, lat, lon)
+        result = await prediction_batcher.submit(speed_kmh, in_geofence, lat, lon)
         
         # Ensure all values are JSON serializable
         return {
@@ -349,12 +358,10 @@ async def test_ml_prediction(
 async def get_all_tourists():
     """Get summary information for all tourists"""
     try:
-        tourists_df = read_csv_safe(CSV_FILES["tourists"])
-        locations_df = read_csv_safe(CSV_FILES["locations"])
-        alerts_df = read_csv_safe(CSV_FILES["alerts"])
+        tourists_df = await asyncio.to_thread(read_csv_safe, CSV_FILES["tourists"])
         
         if len(tourists_df) == 0:
-            return AllTouristsResponse(
+            return model_json_response(AllTouristsResponse(
                 total_tourists=0,
                 tourists=[],
                 summary_stats={
@@ -365,39 +372,33 @@ async def get_all_tourists():
                     "at_risk_tourists": 0,
                     "emergency_tourists": 0
                 }
-            )
+            ))
         
-        tourist_summaries = []
-        total_locations = 0
-        total_alerts = 0
-        risk_scores = []
-        status_counts = {"SAFE": 0, "AT_RISK": 0, "EMERGENCY": 0, "UNKNOWN": 0, "MODERATE_RISK": 0}
+        # Analytics and safety status for every tourist in one batched pass
+        summaries_df = await asyncio.to_thread(summarize_all_tourists, tourists_df['id'].tolist())
         
-        for _, tourist in tourists_df.iterrows():
-            tourist_id = tourist['id']
-            
-            # Get analytics and safety status
-            analytics = get_tourist_analytics(tourist_id)
-            safety_status = get_safety_status(tourist_id)
-            
-            # Create summary
-            summary = TouristSummary(
+        tourist_summaries = [
+            TouristSummary(
                 tourist_id=tourist_id,
-                name=tourist['name'],
-                phone=tourist['phone'],
-                safety_status=safety_status['current_status'],
-                total_locations=analytics['total_locations'],
-                total_alerts=analytics['total_alerts'],
-                last_seen=safety_status['last_seen'],
-                risk_score=analytics['risk_score']
+                name=name,
+                phone=phone,
+                safety_status=summary['current_status'],
+                total_locations=summary['total_locations'],
+                total_alerts=summary['total_alerts'],
+                last_seen=summary['last_seen'],
+                risk_score=summary['risk_score']
             )
-            tourist_summaries.append(summary)
-            
-            # Aggregate statistics
-            total_locations += analytics['total_locations']
-            total_alerts += analytics['total_alerts']
-            risk_scores.append(analytics['risk_score'])
-            status_counts[safety_status['current_status']] = status_counts.get(safety_status['current_status'], 0) + 1
+            for tourist_id, name, phone, summary in zip(
+                tourists_df['id'], tourists_df['name'], tourists_df['phone'], summaries_df.to_dict('records')
+            )
+        ]
+        
+        # Aggregate statistics
+        total_locations = int(summaries_df['total_locations'].sum())
+        total_alerts = int(summaries_df['total_alerts'].sum())
+        risk_scores = summaries_df['risk_score'].tolist()
+        status_counts = {"SAFE": 0, "AT_RISK": 0, "EMERGENCY": 0, "UNKNOWN": 0, "MODERATE_RISK": 0}
+        status_counts.update(summaries_df['current_status'].value_counts().to_dict())
         
         # Calculate summary statistics
         avg_risk_score = sum(risk_scores) / len(risk_scores) if risk_scores else 0.0
@@ -412,11 +413,11 @@ async def get_all_tourists():
             "unknown_tourists": status_counts["UNKNOWN"]
         }
         
-        return AllTouristsResponse(
+        return model_json_response(AllTouristsResponse(
             total_tourists=len(tourists_df),
             tourists=tourist_summaries,
             summary_stats=summary_stats
-        )
+        ))
         
     except Exception as e:
         raise HTTPException(
@@ -428,13 +429,8 @@ async def get_all_tourists():
 async def get_tourist_comprehensive_info(tourist_id: str, include_all_data: bool = False):
     """Get comprehensive information for a specific tourist"""
     try:
-        # Load all data
-        tourists_df = read_csv_safe(CSV_FILES["tourists"])
-        locations_df = read_csv_safe(CSV_FILES["locations"])
-        alerts_df = read_csv_safe(CSV_FILES["alerts"])
-        
         # Check if tourist exists
-        tourist_info = tourists_df[tourists_df['id'] == tourist_id]
+        tourist_info = await asyncio.to_thread(read_rows_where, CSV_FILES["tourists"], "id", tourist_id)
         if len(tourist_info) == 0:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -444,12 +440,12 @@ async def get_tourist_comprehensive_info(tourist_id: str, include_all_data: bool
         tourist = tourist_info.iloc[0]
         
         # Get tourist-specific data
-        tourist_locations = locations_df[locations_df['tourist_id'] == tourist_id]
-        tourist_alerts = alerts_df[alerts_df['tourist_id'] == tourist_id]
+        tourist_locations = await asyncio.to_thread(read_rows_where, CSV_FILES["locations"], "tourist_id", tourist_id)
+        tourist_alerts = await asyncio.to_thread(read_rows_where, CSV_FILES["alerts"], "tourist_id", tourist_id)
         
         # Get analytics and safety status
-        analytics_data = get_tourist_analytics(tourist_id)
-        safety_status_data = get_safety_status(tourist_id)
+        analytics_data = await asyncio.to_thread(get_tourist_analytics, tourist_id)
+        safety_status_data = await asyncio.to_thread(get_safety_status, tourist_id)
         
         # Convert locations to model format
         recent_locations = []
@@ -490,7 +486,7 @@ async def get_tourist_comprehensive_info(tourist_id: str, include_all_data: bool
                     lon=float(alert['lon']),
                     status=str(alert['status']),
                     created_at=str(alert['created_at']),
-                    related_location_id=str(alert.get('related_location_id', '')) or None
+                    related_location_id=optional_text(alert.get('related_location_id'))
                 )
                 all_alerts.append(alert_info)
                 
@@ -523,7 +519,7 @@ async def get_tourist_comprehensive_info(tourist_id: str, include_all_data: bool
             all_alerts=all_alerts if include_all_data else None
         )
         
-        return comprehensive_info
+        return model_json_response(comprehensive_info)
         
     except HTTPException:
         raise
@@ -537,8 +533,8 @@ async def get_tourist_comprehensive_info(tourist_id: str, include_all_data: bool
 async def get_tourist_analytics_only(tourist_id: str):
     """Get detailed analytics for a specific tourist"""
     try:
-        analytics = get_tourist_analytics(tourist_id)
-        safety_status = get_safety_status(tourist_id)
+        analytics = await asyncio.to_thread(get_tourist_analytics, tourist_id)
+        safety_status = await asyncio.to_thread(get_safety_status, tourist_id)
         
         return {
             "tourist_id": tourist_id,
@@ -557,8 +553,7 @@ async def get_tourist_analytics_only(tourist_id: str):
 async def get_tourist_locations(tourist_id: str, limit: Optional[int] = None):
     """Get location history for a specific tourist"""
     try:
-        locations_df = read_csv_safe(CSV_FILES["locations"])
-        tourist_locations = locations_df[locations_df['tourist_id'] == tourist_id]
+        tourist_locations = await asyncio.to_thread(read_rows_where, CSV_FILES["locations"], "tourist_id", tourist_id)
         
         if len(tourist_locations) == 0:
             return {
@@ -603,8 +598,7 @@ async def get_tourist_locations(tourist_id: str, limit: Optional[int] = None):
 async def get_tourist_alerts(tourist_id: str, status_filter: Optional[str] = None):
     """Get alert history for a specific tourist"""
     try:
-        alerts_df = read_csv_safe(CSV_FILES["alerts"])
-        tourist_alerts = alerts_df[alerts_df['tourist_id'] == tourist_id]
+        tourist_alerts = await asyncio.to_thread(read_rows_where, CSV_FILES["alerts"], "tourist_id", tourist_id)
         
         # Apply status filter if specified
         if status_filter:
@@ -629,7 +623,7 @@ async def get_tourist_alerts(tourist_id: str, status_filter: Optional[str] = Non
                 "lon": float(alert['lon']),
                 "status": str(alert['status']),
                 "created_at": str(alert['created_at']),
-                "related_location_id": str(alert.get('related_location_id', '')) or None
+                "related_location_id": optional_text(alert.get('related_location_id'))
             })
         
         return {
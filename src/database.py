@@ -1,63 +1,286 @@
-# SafeHorizon API - CSV Database Operations
+# SafeHorizon API - SQLite Database Operations
+import asyncio
+import csv
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
 import pandas as pd
 import numpy as np
 import os
-from typing import Dict, Any
-from config.settings import CSV_FILES
+from typing import Dict, Any, Tuple, Callable
+from config.settings import CSV_FILES, DB_FILE, BUFFER_CONFIG
+
+# Column order for each table (same as the original CSV headers)
+HEADERS = {
+    "tourists": ["id", "name", "phone", "trip_start", "trip_end"],
+    "locations": ["id", "tourist_id", "lat", "lon", "timestamp", "speed_kmh", "in_geofence", "label"],
+    "alerts": ["id", "tourist_id", "type", "lat", "lon", "status", "created_at", "related_location_id"],
+    "geofences": ["id", "name", "polygon", "severity"]
+}
+
+# Table definitions, one table per former CSV file
+SCHEMA = {
+    "tourists": """CREATE TABLE IF NOT EXISTS tourists (
+        id TEXT PRIMARY KEY, name TEXT, phone TEXT, trip_start TEXT, trip_end TEXT)""",
+    "locations": """CREATE TABLE IF NOT EXISTS locations (
+        id TEXT PRIMARY KEY, tourist_id TEXT, lat REAL, lon REAL, timestamp TEXT,
+        speed_kmh REAL, in_geofence INTEGER, label TEXT)""",
+    "alerts": """CREATE TABLE IF NOT EXISTS alerts (
+        id TEXT PRIMARY KEY, tourist_id TEXT, type TEXT, lat REAL, lon REAL,
+        status TEXT, created_at TEXT, related_location_id TEXT)""",
+    "geofences": """CREATE TABLE IF NOT EXISTS geofences (
+        id TEXT PRIMARY KEY, name TEXT, polygon TEXT, severity TEXT)"""
+}
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_locations_tourist_id ON locations (tourist_id)",
+    "CREATE INDEX IF NOT EXISTS idx_alerts_tourist_id ON alerts (tourist_id)",
+    "CREATE INDEX IF NOT EXISTS idx_alerts_lat_lon ON alerts (lat, lon)"
+]
+
+# Low-cardinality text columns kept as pandas categoricals in cached tables (int8 codes instead of strings)
+CATEGORICAL_COLUMNS = {
+    "locations": ["label"],
+    "alerts": ["type", "status"],
+    "geofences": ["severity"]
+}
+
+INSERT_SQL = {
+    table: f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    for table, columns in HEADERS.items()
+}
+
+# Callers still identify tables by their CSV path; map paths back to table names
+FILE_KEYS = {filename: file_key for file_key, filename in CSV_FILES.items()}
+file_locks = {file_key: threading.RLock() for file_key in CSV_FILES}
+
+# Whole-table reads are cached per table and invalidated by bumping the table's version on every write.
+# Callers get shallow copies that share the cached data: treat them as read-only (adding or dropping
+# columns is fine, but edit values only after taking your own .copy())
+_versions = {file_key: 0 for file_key in CSV_FILES}
+_read_cache: Dict[str, Tuple[int, pd.DataFrame]] = {}
+_derived_cache: Dict[Tuple[str, str], Tuple[int, Any]] = {}
+
+# One connection per thread so WAL readers never wait on the writer
+_local = threading.local()
+
+def get_connection() -> sqlite3.Connection:
+    """Return this thread's database connection, opening it on first use"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+    return conn
+
+# (epoch second, "YYYY-MM-DDTHH:MM:SS") of the last formatted timestamp
+_ts_prefix = (None, "")
+
+def now_isoformat() -> str:
+    """Current local time as an ISO string, formatting the date and time only once per second"""
+    global _ts_prefix
+    second, micros = divmod(time.time_ns() // 1000, 1_000_000)
+    cached_second, prefix = _ts_prefix
+    if cached_second != second:
+        prefix = datetime.fromtimestamp(second).strftime("%Y-%m-%dT%H:%M:%S")
+        _ts_prefix = (second, prefix)
+    return f"{prefix}.{micros:06d}"
+
+def _to_row(file_key: str, data: Dict[str, Any]) -> list:
+    """Order a record's values by table column, storing blanks as NULL"""
+    return [None if data.get(column, "") == "" else data[column] for column in HEADERS[file_key]]
+
+class WriteBuffer:
+    """Collect appended rows in memory and write them to the database in batches"""
+
+    def __init__(self, batch_size: int = 100, max_delay_ms: int = 50):
+        self.batch_size = batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.pending = {file_key: deque() for file_key in CSV_FILES}
+        self.task = None
+
+    def append(self, file_key: str, row: list):
+        """Queue a row, flushing the table early once a full batch is pending"""
+        self.pending[file_key].append(row)
+        if len(self.pending[file_key]) >= self.batch_size:
+            try:
+                self.flush(file_key)
+            except Exception as e:
+                # The row stays queued; the background task retries the flush
+                print(f"Error flushing write buffer: {e}")
+
+    def flush(self, file_key: str = None):
+        """Insert all pending rows for one table (or every table) in one transaction"""
+        for key in ([file_key] if file_key else list(self.pending)):
+            with file_locks[key]:
+                queue = self.pending[key]
+                if not queue:
+                    continue
+                rows = list(queue)
+                conn = get_connection()
+                try:
+                    with conn:
+                        conn.executemany(INSERT_SQL[key], rows)
+                except sqlite3.IntegrityError:
+                    # One bad row rolls back the whole batch: insert row by row so the valid ones are kept
+                    self._insert_each(conn, key, rows)
+                # Only drop rows from the queue once they are committed
+                for _ in rows:
+                    queue.popleft()
+                _versions[key] += 1
+
+    def _insert_each(self, conn: sqlite3.Connection, key: str, rows: list):
+        """Insert rows one at a time, skipping (and reporting) rows the table rejects"""
+        for row in rows:
+            try:
+                with conn:
+                    conn.execute(INSERT_SQL[key], row)
+            except sqlite3.IntegrityError as e:
+                print(f"Dropping invalid {key} row {row[0]}: {e}")
+
+    async def run(self):
+        """Periodically flush pending rows until cancelled"""
+        while True:
+            await asyncio.sleep(self.max_delay)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                print(f"Error flushing write buffer: {e}")
+
+    def start(self):
+        """Start the background flush task on the running event loop"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stop the background flush task and write out anything left"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await asyncio.to_thread(self.flush)
+
+write_buffer = WriteBuffer(BUFFER_CONFIG["batch_size"], BUFFER_CONFIG["max_delay_ms"])
 
 def init_csv_files():
-    """Initialize CSV files with headers if they don't exist"""
-    headers = {
-        "tourists": ["id", "name", "phone", "trip_start", "trip_end"],
-        "locations": ["id", "tourist_id", "lat", "lon", "timestamp", "speed_kmh", "in_geofence", "label"],
-        "alerts": ["id", "tourist_id", "type", "lat", "lon", "status", "created_at", "related_location_id"],
-        "geofences": ["id", "name", "polygon", "severity"]
-    }
-    
-    for file_key, filename in CSV_FILES.items():
-        if not os.path.exists(filename):
-            df = pd.DataFrame(columns=headers[file_key])
-            df.to_csv(filename, index=False)
+    """Create database tables, importing the existing CSV file the first time a table is created"""
+    conn = get_connection()
+    with conn:
+        for file_key, filename in CSV_FILES.items():
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (file_key,)
+            ).fetchone()
+            conn.execute(SCHEMA[file_key])
+
+            if not exists and os.path.exists(filename):
+                with open(filename, newline="") as f:
+                    rows = [_to_row(file_key, record) for record in csv.DictReader(f)]
+                conn.executemany(INSERT_SQL[file_key].replace("INSERT", "INSERT OR IGNORE", 1), rows)
+                print(f"📥 Imported {len(rows)} rows from {filename}")
+
+        for index_sql in INDEXES:
+            conn.execute(index_sql)
+
+def _cached_table(file_key: str) -> Tuple[int, pd.DataFrame]:
+    """Return (version, DataFrame) for a whole table, re-reading it only if it changed (call with its lock held)"""
+    version = _versions[file_key]
+    cached = _read_cache.get(file_key)
+    if cached is None or cached[0] != version:
+        df = pd.read_sql_query(f"SELECT * FROM {file_key} ORDER BY rowid", get_connection())
+        df = df.astype({column: "category" for column in CATEGORICAL_COLUMNS.get(file_key, [])})
+        cached = _read_cache[file_key] = (version, df)
+    return cached
+
+def _flush_before_read(file_key: str):
+    """Make buffered rows visible before reading a table back; a failed flush keeps them queued"""
+    try:
+        write_buffer.flush(file_key)
+    except Exception as e:
+        print(f"Error flushing {file_key} before read: {e}")
 
 def read_csv_safe(filename: str) -> pd.DataFrame:
-    """Safely read CSV file, return empty DataFrame if file doesn't exist"""
+    """Safely read a whole table (cached until the table changes, read-only), return empty DataFrame on error"""
     try:
-        if os.path.exists(filename):
-            return pd.read_csv(filename)
-        else:
-            return pd.DataFrame()
+        file_key = FILE_KEYS[filename]
+        _flush_before_read(file_key)
+        with file_locks[file_key]:
+            _, df = _cached_table(file_key)
+        # Shallow copy: callers can add or drop columns without touching the cached frame
+        return df.copy(deep=False)
     except Exception as e:
         print(f"Error reading {filename}: {e}")
         return pd.DataFrame()
 
+def read_csv_derived(filename: str, name: str, build: Callable[[pd.DataFrame], Any]) -> Tuple[pd.DataFrame, Any]:
+    """Read a whole table plus build(table), both cached under name until the table changes (read-only)"""
+    file_key = FILE_KEYS[filename]
+    _flush_before_read(file_key)
+    with file_locks[file_key]:
+        version, df = _cached_table(file_key)
+        cached = _derived_cache.get((file_key, name))
+        if cached is None or cached[0] != version:
+            cached = _derived_cache[(file_key, name)] = (version, build(df))
+    return df.copy(deep=False), cached[1]
+
+def read_csv_grouped(filename: str, column: str) -> Tuple[pd.DataFrame, Dict[Any, np.ndarray]]:
+    """Read a whole table plus the row positions for each value of column (both cached until the table changes)"""
+    try:
+        return read_csv_derived(filename, f"groups:{column}", lambda df: df.groupby(column, sort=False).indices)
+    except Exception as e:
+        print(f"Error reading {filename}: {e}")
+        return pd.DataFrame(), {}
+
+def read_rows_where(filename: str, column: str, value: Any) -> pd.DataFrame:
+    """Read only the rows of a table whose column equals value (uses the table's indexes)"""
+    try:
+        file_key = FILE_KEYS[filename]
+        if column not in HEADERS[file_key]:
+            raise KeyError(column)
+        _flush_before_read(file_key)
+        return pd.read_sql_query(
+            f"SELECT * FROM {file_key} WHERE {column} = ? ORDER BY rowid",
+            get_connection(),
+            params=(value,)
+        )
+    except Exception as e:
+        print(f"Error reading {filename}: {e}")
+        return pd.DataFrame(columns=HEADERS.get(FILE_KEYS.get(filename), []))
+
 def append_to_csv(filename: str, data: Dict[str, Any]):
-    """Append a row to CSV file"""
+    """Queue a row to be inserted into the table"""
     try:
-        df = read_csv_safe(filename)
-        new_row = pd.DataFrame([data])
-        df = pd.concat([df, new_row], ignore_index=True)
-        df.to_csv(filename, index=False)
+        file_key = FILE_KEYS[filename]
+        write_buffer.append(file_key, _to_row(file_key, data))
         return True
     except Exception as e:
         print(f"Error appending to {filename}: {e}")
         return False
 
 def update_csv_row(filename: str, row_id: str, updates: Dict[str, Any]):
-    """Update a specific row in CSV file"""
+    """Update a specific row in the table"""
     try:
-        df = read_csv_safe(filename)
-        if df.empty:
-            return False
-        
-        mask = df['id'] == row_id
-        if not mask.any():
-            return False
-            
-        for col, value in updates.items():
-            df.loc[mask, col] = value
-        
-        df.to_csv(filename, index=False)
-        return True
+        file_key = FILE_KEYS[filename]
+        unknown = [col for col in updates if col not in HEADERS[file_key]]
+        if unknown:
+            raise KeyError(f"Unknown columns: {unknown}")
+
+        assignments = ", ".join(f"{col} = ?" for col in updates)
+        write_buffer.flush(file_key)
+
+        conn = get_connection()
+        with file_locks[file_key], conn:
+            cursor = conn.execute(
+                f"UPDATE {file_key} SET {assignments} WHERE id = ?",
+                [*updates.values(), row_id]
+            )
+            _versions[file_key] += 1
+        return cursor.rowcount > 0
     except Exception as e:
         print(f"Error updating {filename}: {e}")
         return False
@@ -66,4 +289,10 @@ def safe_json_convert(df):
     """Convert DataFrame to JSON-safe format by handling NaN, inf, and -inf values"""
     # Replace NaN, inf, -inf with None for JSON compliance
     df_clean = df.replace([np.nan, np.inf, -np.inf], None)
-    return df_clean.to_dict('records')
\ No newline at end of file
+    return df_clean.to_dict('records')
+
+def optional_text(value: Any):
+    """A stored text value as a string, or None for NULL, NaN and blank values"""
+    if value is None or pd.isna(value) or value == "":
+        return None
+    return str(value)
@@ -1,50 +1,127 @@
 # SafeHorizon API - Geofencing Operations
 import json
-from typing import List, Optional, Dict, Any
+import threading
+import numpy as np
+import shapely
+from typing import List, Optional, Dict, Any, Union
 from shapely.geometry import Point, Polygon
+from shapely.prepared import PreparedGeometry, prep
+from shapely.strtree import STRtree
 from src.database import read_csv_safe
 from config.settings import CSV_FILES
 
-def point_in_polygon(lat: float, lon: float, polygon_coords: List[List[float]]) -> bool:
-    """Check if a point is inside a polygon"""
+# Spatial index over geofence polygons, built once and rebuilt when geofences change
+_tree: Optional[STRtree] = None
+_polys: List[Polygon] = []
+_coords: List[np.ndarray] = []  # (n, 2) [lat, lon] vertex arrays, parsed from JSON once per geofence
+_prepared: List[PreparedGeometry] = []
+_meta: List[Dict[str, Any]] = []
+_index_lock = threading.Lock()
+
+def parse_coords(polygon: Union[str, List[List[float]]]) -> np.ndarray:
+    """Parse a stored polygon (JSON text or [[lat, lon], ...] list) into an (n, 2) float64 array"""
+    if isinstance(polygon, str):
+        polygon = json.loads(polygon)
+    return np.asarray(polygon, dtype=np.float64)
+
+def build_polygon(polygon_coords: np.ndarray) -> Optional[Polygon]:
+    """Build a Shapely polygon from an (n, 2) [lat, lon] coordinate array, or None if invalid"""
+    if len(polygon_coords) < 3:
+        print("Error: Polygon must have at least 3 coordinates")
+        return None
+
+    if polygon_coords.ndim != 2 or polygon_coords.shape[1] < 2:
+        print(f"Error: Invalid coordinate format: {polygon_coords.tolist()}")
+        return None
+
+    polygon = Polygon(polygon_coords[:, 1::-1])  # Convert to (lon, lat)
+    return polygon if polygon.is_valid else None
+
+def _add_geofence(geofence: Dict[str, Any], polys: List[Polygon], coords: List[np.ndarray],
+                  meta: List[Dict[str, Any]]):
+    """Parse one geofence record and add its polygon to the index lists"""
     try:
-        point = Point(lon, lat)  # Note: Shapely uses (x, y) = (lon, lat)
-        
-        # Validate polygon coordinates
-        if len(polygon_coords) < 3:
-            print("Error: Polygon must have at least 3 coordinates")
-            return False
-            
-        # Convert polygon coordinates: assume input is [[lat, lon], ...], convert to [(lon, lat), ...]
-        polygon_points = []
-        for coord in polygon_coords:
-            if len(coord) >= 2:
-                polygon_points.append((coord[1], coord[0]))  # Convert to (lon, lat)
-            else:
-                print(f"Error: Invalid coordinate format: {coord}")
-                return False
-                
-        polygon = Polygon(polygon_points)
-        return polygon.is_valid and polygon.contains(point)
-        
-    except (IndexError, TypeError, ValueError) as e:
-        print(f"Error in point_in_polygon: {e}")
-        return False
+        polygon_coords = parse_coords(geofence['polygon'])
+        polygon = build_polygon(polygon_coords)
+        if polygon is not None:
+            polys.append(polygon)
+            coords.append(polygon_coords)
+            meta.append({
+                "id": geofence['id'],
+                "name": geofence['name'],
+                "severity": geofence['severity']
+            })
+    except (json.JSONDecodeError, KeyError, TypeError, IndexError, ValueError) as e:
+        print(f"Error processing geofence {geofence.get('id', 'unknown')}: {e}")
+
+def init_geofence_index():
+    """Load all geofences and build the spatial index"""
+    global _tree, _polys, _coords, _prepared, _meta
+
+    geofences_df = read_csv_safe(CSV_FILES["geofences"])
+    polys, coords, meta = [], [], []
+    for geofence in geofences_df.to_dict('records'):
+        _add_geofence(geofence, polys, coords, meta)
+
+    with _index_lock:
+        _tree = STRtree(polys)
+        _polys, _coords, _prepared, _meta = polys, coords, [prep(polygon) for polygon in polys], meta
+    print(f"🗺️ Geofence index built with {len(polys)} polygons")
+
+def update_geofence_index(geofence: Dict[str, Any]):
+    """Add a newly created geofence (polygon as JSON text or a coordinate list) to the spatial index"""
+    global _tree, _polys, _coords, _prepared, _meta
+
+    if _tree is None:
+        init_geofence_index()
+        return
+
+    with _index_lock:
+        polys, coords, prepared, meta = list(_polys), list(_coords), list(_prepared), list(_meta)
+        _add_geofence(geofence, polys, coords, meta)
+        prepared.extend(prep(polygon) for polygon in polys[len(prepared):])
+        _tree = STRtree(polys)
+        _polys, _coords, _prepared, _meta = polys, coords, prepared, meta
 
 def check_geofences(lat: float, lon: float) -> Optional[Dict[str, Any]]:
     """Check if location is in any restricted geofence"""
-    geofences_df = read_csv_safe(CSV_FILES["geofences"])
-    
-    for _, geofence in geofences_df.iterrows():
-        try:
-            polygon_data = json.loads(geofence['polygon'])
-            if point_in_polygon(lat, lon, polygon_data):
-                return {
-                    "id": geofence['id'],
-                    "name": geofence['name'],
-                    "severity": geofence['severity']
-                }
-        except (json.JSONDecodeError, KeyError, TypeError) as e:
-            print(f"Error processing geofence {geofence.get('id', 'unknown')}: {e}")
-    
-    return None
\ No newline at end of file
+    if _tree is None:
+        init_geofence_index()
+
+    with _index_lock:
+        tree, prepared, meta = _tree, _prepared, _meta
+
+    point = Point(lon, lat)  # Note: Shapely uses (x, y) = (lon, lat)
+    # The tree only returns polygons whose bounding box holds the point; keep the original first-match order
+    for idx in sorted(tree.query(point)):
+        if prepared[idx].contains(point):
+            return meta[idx]
+
+    return None
+
+def geofence_coords() -> List[np.ndarray]:
+    """Snapshot of every indexed geofence's (n, 2) [lat, lon] vertex array (picklable, unlike the index)"""
+    if _tree is None:
+        init_geofence_index()
+
+    with _index_lock:
+        return _coords
+
+def batch_check_geofences(lats: np.ndarray, lons: np.ndarray,
+                          polygon_coords: Optional[List[np.ndarray]] = None) -> np.ndarray:
+    """Return a boolean mask of which points fall inside any restricted geofence (or the given vertex arrays)"""
+    if polygon_coords is not None:
+        polys = [polygon for polygon in map(build_polygon, polygon_coords) if polygon is not None]
+    else:
+        if _tree is None:
+            init_geofence_index()
+
+        with _index_lock:
+            polys = _polys
+
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    mask = np.zeros(lats.shape, dtype=bool)
+    for polygon in polys:
+        mask |= shapely.contains_xy(polygon, lons, lats)
+    return mask
@@ -1,203 +1,356 @@
 # SafeHorizon API - Enhanced Machine Learning Operations with Auto-Retraining
+import asyncio
+import multiprocessing
 import pandas as pd
+import numpy as np
 import pickle
 import os
-import time
 import threading
-from datetime import datetime, timedelta
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
 from pathlib import Path
+from typing import List, Optional
 from sklearn.ensemble import IsolationForest
+from sklearn.neighbors import KDTree
 from sklearn.preprocessing import StandardScaler
 from src.database import read_csv_safe
+from src.geofencing import batch_check_geofences, geofence_coords
+from src.tourist_analytics import parse_timestamps
 from config.settings import CSV_FILES, MODEL_FILE, SCALER_FILE, ML_CONFIG
 
 # Global variables for ML model
 anomaly_model = None
 scaler = None
 last_training_time = None
-last_data_hash = None
 retrain_lock = threading.Lock()
 auto_retrain_enabled = True
-monitor_thread = None
+_retrain_future = None  # Background training run submitted from the location path (at most one)
 
-def calculate_data_hash():
-    """Calculate hash of all relevant data files for change detection"""
-    try:
-        hash_string = ""
-        for file_type, file_path in CSV_FILES.items():
-            if os.path.exists(file_path):
-                stat = os.stat(file_path)
-                hash_string += f"{file_path}:{stat.st_mtime}:{stat.st_size};"
-        return hash(hash_string)
-    except Exception as e:
-        print(f"Error calculating data hash: {e}")
-        return 0
+# Training runs in a separate process so fitting never holds the server's GIL; the worker is spawned
+# (not forked) so it cannot inherit locks held by the server's other threads
+def _new_trainer_pool() -> ProcessPoolExecutor:
+    """Create the single-worker trainer pool"""
+    return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
 
-def extract_enhanced_features():
-    """Extract enhanced features from all available data"""
-    try:
-        locations_df = read_csv_safe(CSV_FILES["locations"])
-        alerts_df = read_csv_safe(CSV_FILES["alerts"])
-        
-        if len(locations_df) < 5:
-            return None
-        
-        # Basic features
-        features = locations_df[['speed_kmh', 'in_geofence']].fillna(0)
-        
-        # Enhanced features if we have enough data
-        if len(locations_df) > 10:
-            # Add time-based features
-            locations_df['timestamp'] = pd.to_datetime(locations_df['timestamp'], errors='coerce')
-            locations_df['hour'] = locations_df['timestamp'].dt.hour.fillna(12)
-            
-            # Add location-based risk score
-            if len(alerts_df) > 0:
-                location_risk = []
-                for _, row in locations_df.iterrows():
-                    # Count alerts near this location
-                    nearby_alerts = alerts_df[
-                        (abs(alerts_df['lat'] - row['lat']) < 0.01) & 
-                        (abs(alerts_df['lon'] - row['lon']) < 0.01)
-                    ]
-                    risk_score = len(nearby_alerts) / max(len(alerts_df), 1)
-                    location_risk.append(risk_score)
-                
-                features['location_risk'] = location_risk
-            else:
-                features['location_risk'] = 0
-            
-            # Add speed anomaly score
-            speed_mean = locations_df['speed_kmh'].mean()
-            speed_std = locations_df['speed_kmh'].std()
-            if speed_std > 0:
-                features['speed_anomaly'] = abs(features['speed_kmh'] - speed_mean) / speed_std
-            else:
-                features['speed_anomaly'] = 0
-            
-            # Add hour of day
-            features['hour'] = locations_df['hour'].fillna(12)
+_trainer_pool = _new_trainer_pool()
+_trainer_lock = threading.Lock()
+
+# Running statistics used at prediction time, kept in memory instead of re-reading tables
+_stats_lock = threading.Lock()
+_speed_count = 0
+_speed_mean = 0.0
+_speed_m2 = 0.0  # Sum of squared deviations from the mean (Welford)
+_alert_coords = np.empty((0, 2))
+_new_alert_coords = []  # [lat, lon] of alerts stored since _alert_coords was last rebuilt
+_alert_tree = None  # KDTree over _alert_coords, rebuilt lazily after new alerts
+
+# Raw per-location training inputs [lat, lon, speed_kmh, hour], appended as locations arrive
+_features_cache = []
+_dirty = 0  # Locations stored since the last training run
+
+# float32 (scaler, mean_, scale_) of the scaler last used for prediction, so scaling skips sklearn's validation
+_scaling = (None, None, None)
+
+# Column order of the feature matrix (basic models use only the first two)
+FEATURE_NAMES = ['speed_kmh', 'in_geofence', 'location_risk', 'speed_anomaly', 'hour']
+
+# Alerts count as "nearby" when both |dlat| and |dlon| are under this many degrees
+NEARBY_ALERT_DEGREES = 0.01
+
+def _current_alert_coords() -> np.ndarray:
+    """All alert coordinates, folding in newly observed alerts in one step (call with _stats_lock held)"""
+    global _alert_coords, _new_alert_coords
+    
+    if _new_alert_coords:
+        _alert_coords = np.vstack([_alert_coords, _new_alert_coords])
+        _new_alert_coords = []
+    return _alert_coords
+
+def build_alert_tree(alert_coords: np.ndarray):
+    """Build a Chebyshev-metric KDTree over alert coordinates (None if there are none)"""
+    alert_coords = alert_coords[~np.isnan(alert_coords).any(axis=1)]
+    if len(alert_coords) == 0:
+        return None
+    return KDTree(alert_coords, metric='chebyshev')
+
+def count_nearby_alerts(alert_tree, points: np.ndarray) -> np.ndarray:
+    """Count alerts within NEARBY_ALERT_DEGREES of each (lat, lon) point"""
+    counts = np.zeros(len(points), dtype=np.int64)
+    valid = ~np.isnan(points).any(axis=1)
+    if alert_tree is not None and valid.any():
+        # The tree includes points at exactly r, the original comparison was strict
+        radius = np.nextafter(NEARBY_ALERT_DEGREES, 0)
+        counts[valid] = alert_tree.query_radius(points[valid], r=radius, count_only=True)
+    return counts
+
+def build_features(lat: np.ndarray, lon: np.ndarray, speed: np.ndarray, hour: np.ndarray,
+                   alert_coords: np.ndarray, polygon_coords: Optional[List[np.ndarray]] = None) -> np.ndarray:
+    """Build the float32 feature matrix from plain per-location arrays (5 columns if more than 10 rows, else 2)"""
+    n_rows = len(lat)
+    enhanced = n_rows > 10
+    out = np.empty((n_rows, len(FEATURE_NAMES) if enhanced else 2), dtype=np.float32)
+    
+    # Basic features (geofence status is recomputed against the current geofences)
+    out[:, 0] = np.nan_to_num(speed)
+    out[:, 1] = batch_check_geofences(lat, lon, polygon_coords)
+    
+    # Enhanced features if we have enough data
+    if enhanced:
+        # Add location-based risk score, counting alerts near each location in one batched tree query
+        if len(alert_coords) > 0:
+            nearby_alerts = count_nearby_alerts(build_alert_tree(alert_coords), np.column_stack([lat, lon]))
+            out[:, 2] = nearby_alerts / len(alert_coords)
+        else:
+            out[:, 2] = 0
         
-        return features.fillna(0)
+        # Add speed anomaly score
+        speed_mean = np.nanmean(speed)
+        speed_std = np.nanstd(speed, ddof=1)
+        if speed_std > 0:
+            out[:, 3] = np.abs(np.nan_to_num(speed) - speed_mean) / speed_std
+        else:
+            out[:, 3] = 0
         
+        # Add hour of day
+        out[:, 4] = np.nan_to_num(hour, nan=12)
+    
+    # float32 halves the bytes the scaler and the forest have to read
+    return np.nan_to_num(out, copy=False)
+
+def _training_snapshot():
+    """Copy the raw training inputs: [lat, lon, speed_kmh, hour] rows, alert coordinates, geofence vertices"""
+    with _stats_lock:
+        rows, alert_coords = list(_features_cache), _current_alert_coords()
+    return rows, alert_coords, geofence_coords()
+
+def _features_from_snapshot(rows: list, alert_coords: np.ndarray, polygon_coords: List[np.ndarray]):
+    """Build the feature matrix from a training snapshot (None if there are too few locations)"""
+    rows = np.array(rows, dtype=float).reshape(-1, 4)
+    if len(rows) < 5:
+        return None
+    
+    lat, lon, speed, hour = rows.T
+    return build_features(lat, lon, speed, hour, alert_coords, polygon_coords)
+
+def extract_enhanced_features():
+    """Extract an (n_locations, n_features) float32 feature matrix from the in-memory history"""
+    try:
+        return _features_from_snapshot(*_training_snapshot())
     except Exception as e:
         print(f"Error extracting enhanced features: {e}")
         return None
 
-def train_anomaly_model():
-    """Train IsolationForest model using enhanced features"""
+def _save_pickle(obj, path: str):
+    """Pickle obj to path via a temporary file so readers never see a partial write"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(obj, f)
+    os.replace(tmp_path, path)
+
+def _fit_and_save(features):
+    """Fit scaler and IsolationForest, save both and return them (runs in the trainer process)"""
+    if features is None or len(features) < 5:
+        print("Insufficient data for ML training. Using basic model.")
+        # Create basic model with minimal features
+        new_scaler = StandardScaler()
+        new_model = IsolationForest(
+            contamination=ML_CONFIG["contamination"], 
+            random_state=ML_CONFIG["random_state"]
+        )
+        # Fit with dummy data
+        dummy_data = np.array([[30, 0], [40, 1], [50, 0]], dtype=np.float32)
+        new_scaler.fit(dummy_data)
+        new_model.fit(dummy_data)
+    else:
+        # Scale features
+        new_scaler = StandardScaler()
+        features_scaled = new_scaler.fit_transform(features)
+        
+        # Train enhanced model
+        contamination = min(0.2, max(0.05, ML_CONFIG["contamination"]))  # Dynamic contamination
+        new_model = IsolationForest(
+            contamination=contamination,
+            random_state=ML_CONFIG["random_state"],
+            n_estimators=100,
+            max_samples='auto'
+        )
+        new_model.fit(features_scaled)
+        
+        print(f"✅ ML model trained with {len(features)} samples using {features.shape[1]} features")
+        print(f"📊 Features: {FEATURE_NAMES[:features.shape[1]]}")
+    
+    # Save model and scaler
+    os.makedirs(os.path.dirname(MODEL_FILE), exist_ok=True)
+    _save_pickle(new_model, MODEL_FILE)
+    _save_pickle(new_scaler, SCALER_FILE)
+    
+    return new_model, new_scaler
+
+def _featurize_fit_and_save(rows: list, alert_coords: np.ndarray, polygon_coords: List[np.ndarray]):
+    """Build features from a training snapshot, then fit and save (runs in the trainer process)"""
+    return _fit_and_save(_features_from_snapshot(rows, alert_coords, polygon_coords))
+
+def _install_model(trained):
+    """Swap in a freshly trained (model, scaler) pair in one step"""
     global anomaly_model, scaler, last_training_time
     
+    anomaly_model, scaler = trained
+    last_training_time = datetime.now()
+    print(f"🎯 Model saved successfully at {last_training_time}")
+
+def _submit_training(fn, *args) -> Future:
+    """Submit a job to the trainer process, restarting the process first if it has died"""
+    global _trainer_pool
+    
+    with _trainer_lock:
+        try:
+            return _trainer_pool.submit(fn, *args)
+        except BrokenProcessPool:
+            print("⚠️ Trainer process died - restarting it")
+            _trainer_pool.shutdown(wait=False, cancel_futures=True)
+            _trainer_pool = _new_trainer_pool()
+            return _trainer_pool.submit(fn, *args)
+
+def _run_training(fn, *args):
+    """Run a job in the trainer process and wait for it, retrying once if the process died during the job"""
+    try:
+        return _submit_training(fn, *args).result()
+    except BrokenProcessPool:
+        return _submit_training(fn, *args).result()
+
+async def _run_training_async(fn, *args):
+    """Like _run_training, but awaits the job instead of blocking the event loop"""
+    try:
+        return await asyncio.wrap_future(_submit_training(fn, *args))
+    except BrokenProcessPool:
+        return await asyncio.wrap_future(_submit_training(fn, *args))
+
+def shutdown_trainer():
+    """Cancel pending training jobs and stop the trainer process"""
+    with _trainer_lock:
+        _trainer_pool.shutdown(cancel_futures=True)
+
+def train_anomaly_model():
+    """Train IsolationForest model using enhanced features (blocks until the trainer process is done)"""
+    global _dirty
+    
     try:
         print("🤖 Starting ML model training...")
+        _dirty = 0
         
-        # Extract features
-        features_df = extract_enhanced_features()
-        
-        if features_df is None or len(features_df) < 5:
-            print("Insufficient data for ML training. Using basic model.")
-            # Create basic model with minimal features
-            scaler = StandardScaler()
-            anomaly_model = IsolationForest(
-                contamination=ML_CONFIG["contamination"], 
-                random_state=ML_CONFIG["random_state"]
-            )
-            # Fit with dummy data
-            dummy_data = pd.DataFrame([[30, 0], [40, 1], [50, 0]], columns=['speed_kmh', 'in_geofence'])
-            scaler.fit(dummy_data)
-            anomaly_model.fit(dummy_data)
-        else:
-            # Scale features
-            scaler = StandardScaler()
-            features_scaled = scaler.fit_transform(features_df)
-            
-            # Train enhanced model
-            contamination = min(0.2, max(0.05, ML_CONFIG["contamination"]))  # Dynamic contamination
-            anomaly_model = IsolationForest(
-                contamination=contamination,
-                random_state=ML_CONFIG["random_state"],
-                n_estimators=100,
-                max_samples='auto'
-            )
-            anomaly_model.fit(features_scaled)
-            
-            print(f"✅ ML model trained with {len(features_df)} samples using {len(features_df.columns)} features")
-            print(f"📊 Features: {list(features_df.columns)}")
-        
-        # Save model and scaler
-        os.makedirs(os.path.dirname(MODEL_FILE), exist_ok=True)
-        with open(MODEL_FILE, 'wb') as f:
-            pickle.dump(anomaly_model, f)
-        with open(SCALER_FILE, 'wb') as f:
-            pickle.dump(scaler, f)
-        
-        last_training_time = datetime.now()
-        print(f"🎯 Model saved successfully at {last_training_time}")
+        # Extract features here, fit in the trainer process
+        features = extract_enhanced_features()
+        _install_model(_run_training(_fit_and_save, features))
+        return True
             
     except Exception as e:
         print(f"❌ Error training ML model: {e}")
+        return False
 
-def should_retrain():
-    """Check if model should be retrained based on data changes"""
-    global last_data_hash, last_training_time
+def _on_retrain_done(future):
+    """Install the model from a finished background training run"""
+    global _dirty
     
     try:
-        # Check if enough time has passed (minimum 30 seconds between retrains)
-        if last_training_time:
-            time_since_training = datetime.now() - last_training_time
-            if time_since_training < timedelta(seconds=30):
-                return False
+        _install_model(future.result())
+    except BrokenProcessPool as e:
+        # The trainer process died mid-run: retry on the next stored location (the pool is restarted on submit)
+        print(f"❌ Error training ML model: {e}")
+        _dirty = max(_dirty, ML_CONFIG["retrain_interval"])
+    except Exception as e:
+        print(f"❌ Error training ML model: {e}")
+
+def schedule_retrain_if_due():
+    """Submit a background retrain to the trainer process once enough new locations have been stored"""
+    global _retrain_future, _dirty
+    
+    if not auto_retrain_enabled or _dirty < ML_CONFIG["retrain_interval"]:
+        return
+    if not retrain_lock.acquire(blocking=False):
+        return
+    try:
+        # Single slot: while a run is pending, new locations just keep counting towards the next one
+        if _retrain_future is not None and not _retrain_future.done():
+            return
+        print("📊 Retrain interval reached - starting auto-retrain...")
+        _dirty = 0
+        # Only a cheap snapshot is taken here; featurizing the history happens in the trainer process
+        _retrain_future = _submit_training(_featurize_fit_and_save, *_training_snapshot())
+        _retrain_future.add_done_callback(_on_retrain_done)
+    finally:
+        retrain_lock.release()
+
+def stop_auto_retrain():
+    """Stop scheduling automatic retraining"""
+    global auto_retrain_enabled
+    auto_retrain_enabled = False
+    print("⏹️ Auto-retrain stopped")
+
+def load_feature_stats():
+    """Initialize running speed statistics and alert coordinates from stored data"""
+    global _speed_count, _speed_mean, _speed_m2, _alert_coords, _new_alert_coords, _alert_tree, _features_cache
+    
+    try:
+        locations_df = read_csv_safe(CSV_FILES["locations"])
+        alerts_df = read_csv_safe(CSV_FILES["alerts"])
         
-        # Check if data has changed
-        current_hash = calculate_data_hash()
-        if last_data_hash is None or current_hash != last_data_hash:
-            last_data_hash = current_hash
-            return True
+        speeds = locations_df['speed_kmh'].dropna().to_numpy(dtype=float) if len(locations_df) > 0 else np.empty(0)
+        coords = alerts_df[['lat', 'lon']].to_numpy(dtype=float) if len(alerts_df) > 0 else np.empty((0, 2))
         
-        return False
+        features_cache = []
+        if len(locations_df) > 0:
+            hours = pd.Series(parse_timestamps(locations_df['timestamp'])).dt.hour
+            features_cache = np.column_stack([
+                locations_df[['lat', 'lon', 'speed_kmh']].to_numpy(dtype=float),
+                hours.to_numpy(dtype=float)
+            ]).tolist()
         
+        with _stats_lock:
+            _features_cache = features_cache
+            _speed_count = len(speeds)
+            _speed_mean = float(speeds.mean()) if len(speeds) > 0 else 0.0
+            _speed_m2 = float(((speeds - _speed_mean) ** 2).sum())
+            _alert_coords = coords
+            _new_alert_coords = []
+            _alert_tree = None
     except Exception as e:
-        print(f"Error checking retrain condition: {e}")
-        return False
+        print(f"Error loading feature statistics: {e}")
 
-def auto_retrain_monitor():
-    """Background thread to monitor data changes and auto-retrain"""
-    global auto_retrain_enabled
+def observe_location(location_data: dict):
+    """Fold a newly stored location into the running statistics and feature cache"""
+    global _speed_count, _speed_mean, _speed_m2, _dirty
     
-    print("🔄 Auto-retrain monitor started")
+    speed = location_data.get("speed_kmh")
+    if speed is None or pd.isna(speed):
+        speed = np.nan
+    hour = datetime.fromisoformat(location_data["timestamp"]).hour
     
-    while auto_retrain_enabled:
-        try:
-            if should_retrain():
-                with retrain_lock:
-                    print("📊 Data changes detected - starting auto-retrain...")
-                    train_anomaly_model()
-            
-            time.sleep(10)  # Check every 10 seconds
-            
-        except Exception as e:
-            print(f"Error in auto-retrain monitor: {e}")
-            time.sleep(30)  # Wait longer on error
-
-def start_auto_retrain_monitor():
-    """Start the auto-retrain monitoring thread"""
-    global monitor_thread, auto_retrain_enabled
+    with _stats_lock:
+        _features_cache.append([location_data["lat"], location_data["lon"], speed, hour])
+        _dirty += 1
+        if not np.isnan(speed):
+            _speed_count += 1
+            delta = speed - _speed_mean
+            _speed_mean += delta / _speed_count
+            _speed_m2 += delta * (speed - _speed_mean)
     
-    if monitor_thread is None or not monitor_thread.is_alive():
-        auto_retrain_enabled = True
-        monitor_thread = threading.Thread(target=auto_retrain_monitor, daemon=True)
-        monitor_thread.start()
-        print("✅ Auto-retrain monitor started")
+    schedule_retrain_if_due()
 
-def stop_auto_retrain_monitor():
-    """Stop the auto-retrain monitoring"""
-    global auto_retrain_enabled
-    auto_retrain_enabled = False
-    print("⏹️ Auto-retrain monitor stopped")
+def observe_alert(alert_data: dict):
+    """Record a newly stored alert's coordinates for location risk scoring (O(1); folded in when next needed)"""
+    global _alert_tree
+    
+    with _stats_lock:
+        _new_alert_coords.append([alert_data["lat"], alert_data["lon"]])
+        _alert_tree = None
 
 def load_or_train_model():
-    """Load existing model or train new one, then start auto-monitoring"""
-    global anomaly_model, scaler
+    """Load existing model or train new one, then enable auto-retraining"""
+    global anomaly_model, scaler, auto_retrain_enabled
+    
+    load_feature_stats()
+    auto_retrain_enabled = True
     
     try:
         if os.path.exists(MODEL_FILE) and os.path.exists(SCALER_FILE):
@@ -210,111 +363,217 @@ def load_or_train_model():
             print("🆕 No existing model found, training new one...")
             train_anomaly_model()
         
-        # Start auto-retrain monitoring
-        start_auto_retrain_monitor()
-        
     except Exception as e:
         print(f"❌ Error loading model: {e}")
         train_anomaly_model()
-        start_auto_retrain_monitor()
 
-def force_retrain():
-    """Force immediate retraining (useful for API endpoints)"""
-    global last_data_hash
+async def force_retrain():
+    """Force immediate retraining without blocking the event loop (useful for API endpoints)"""
+    global _dirty
     
     try:
-        with retrain_lock:
-            print("🔄 Force retraining ML model...")
-            last_data_hash = None  # Reset hash to force retrain
-            train_anomaly_model()
-            return True
+        print("🔄 Force retraining ML model...")
+        _dirty = 0
+        features = await asyncio.to_thread(extract_enhanced_features)
+        
+        trained = await _run_training_async(_fit_and_save, features)
+        _install_model(trained)
+        return True
     except Exception as e:
         print(f"❌ Error in force retrain: {e}")
         return False
 
-def predict_anomaly(speed_kmh: float, in_geofence: int, lat: float = None, lon: float = None) -> dict:
-    """Enhanced anomaly prediction with confidence scoring"""
-    global anomaly_model, scaler
+def _feature_rows(requests: list, n_features: int) -> np.ndarray:
+    """Build one float32 feature row per (speed_kmh, in_geofence, lat, lon) request"""
+    global _alert_tree
+    
+    x = np.zeros((len(requests), n_features), dtype=np.float32)
+    if n_features == 2:
+        # Basic model
+        for i, (speed_kmh, in_geofence, _, _) in enumerate(requests):
+            x[i] = [speed_kmh, in_geofence]
+        return x
+    
+    # Enhanced model - additional features come from the in-memory statistics
+    with _stats_lock:
+        alert_coords = _current_alert_coords()
+        if _alert_tree is None and len(alert_coords) > 0:
+            _alert_tree = build_alert_tree(alert_coords)
+        alert_tree, alert_count = _alert_tree, len(alert_coords)
+        speed_count, speed_mean, speed_m2 = _speed_count, _speed_mean, _speed_m2
+    
+    # Calculate location risk for every request with coordinates in one tree query
+    location_risk = np.zeros(len(requests))
+    if alert_count > 0:
+        points = np.array([
+            [np.nan, np.nan] if lat is None or lon is None else [lat, lon]
+            for _, _, lat, lon in requests
+        ], dtype=float)
+        location_risk = count_nearby_alerts(alert_tree, points) / alert_count
+    
+    # Calculate speed anomaly (sample standard deviation, as pandas computes it)
+    speed_std = (speed_m2 / (speed_count - 1)) ** 0.5 if speed_count > 1 else 0
+    
+    # Current hour
+    current_hour = datetime.now().hour
+    
+    for i, (speed_kmh, in_geofence, _, _) in enumerate(requests):
+        speed_anomaly = abs(speed_kmh - speed_mean) / speed_std if speed_std > 0 else 0
+        # Fill the feature vector, padded or trimmed to match model expectations
+        row = [speed_kmh, in_geofence, location_risk[i], speed_anomaly, current_hour][:n_features]
+        x[i, :len(row)] = row
+    return x
+
+def _scaling_arrays(model_scaler):
+    """Return the scaler's mean and scale as float32 arrays, cached until the scaler is replaced"""
+    global _scaling
+    
+    cached_scaler, mean, scale = _scaling
+    if cached_scaler is not model_scaler:
+        mean = model_scaler.mean_.astype(np.float32)
+        scale = model_scaler.scale_.astype(np.float32)
+        _scaling = (model_scaler, mean, scale)
+    return mean, scale
+
+def predict_anomaly_batch(requests: list) -> list:
+    """Score a list of (speed_kmh, in_geofence, lat, lon) requests with one model call"""
+    default = {"is_anomaly": False, "confidence": 0.0, "score": 0.0}
     
     try:
-        if anomaly_model is None or scaler is None:
-            return {"is_anomaly": False, "confidence": 0.0, "score": 0.0}
+        # Use one (model, scaler) pair for the whole batch even if a retrain swaps them meanwhile
+        model, model_scaler = anomaly_model, scaler
+        if model is None or model_scaler is None or not requests:
+            return [dict(default) for _ in requests]
         
         # Prepare features based on what the model was trained with
-        try:
-            # Try to get the feature names from the scaler
-            n_features = scaler.n_features_in_
-        except:
-            n_features = 2  # Default to basic features
+        n_features = getattr(model_scaler, 'n_features_in_', 2)
+        x = _feature_rows(requests, n_features)
         
-        if n_features == 2:
-            # Basic model
-            features_df = pd.DataFrame([[speed_kmh, in_geofence]], columns=['speed_kmh', 'in_geofence'])
-        else:
-            # Enhanced model - calculate additional features
-            alerts_df = read_csv_safe(CSV_FILES["alerts"])
-            
-            # Calculate location risk if coordinates provided
-            location_risk = 0
-            if lat is not None and lon is not None and len(alerts_df) > 0:
-                nearby_alerts = alerts_df[
-                    (abs(alerts_df['lat'] - lat) < 0.01) & 
-                    (abs(alerts_df['lon'] - lon) < 0.01)
-                ]
-                location_risk = len(nearby_alerts) / max(len(alerts_df), 1)
-            
-            # Calculate speed anomaly
-            locations_df = read_csv_safe(CSV_FILES["locations"])
-            speed_anomaly = 0
-            if len(locations_df) > 0:
-                speed_mean = locations_df['speed_kmh'].mean()
-                speed_std = locations_df['speed_kmh'].std()
-                if speed_std > 0:
-                    speed_anomaly = abs(speed_kmh - speed_mean) / speed_std
-            
-            # Current hour
-            current_hour = datetime.now().hour
-            
-            # Create feature vector
-            features_df = pd.DataFrame([[
-                speed_kmh, in_geofence, location_risk, speed_anomaly, current_hour
-            ]], columns=['speed_kmh', 'in_geofence', 'location_risk', 'speed_anomaly', 'hour'])
-            
-            # Pad or trim features to match model expectations
-            if len(features_df.columns) < n_features:
-                for i in range(len(features_df.columns), n_features):
-                    features_df[f'feature_{i}'] = 0
-            elif len(features_df.columns) > n_features:
-                features_df = features_df.iloc[:, :n_features]
+        # Standardize in place, same as scaler.transform() without the validation and copies
+        mean, scale = _scaling_arrays(model_scaler)
+        x -= mean
+        x /= scale
         
-        # Make prediction
-        features_scaled = scaler.transform(features_df)
-        prediction = anomaly_model.predict(features_scaled)
-        decision_score = anomaly_model.decision_function(features_scaled)[0]
+        # Make predictions with a single pass over the trees:
+        # IsolationForest.predict() is just decision_function() < 0, so don't walk the forest twice
+        decision_scores = model.decision_function(x)
         
-        is_anomaly = prediction[0] == -1
-        confidence = abs(decision_score)
-        
-        return {
-            "is_anomaly": bool(is_anomaly),  # Convert numpy.bool_ to Python bool
-            "confidence": float(confidence),
-            "score": float(decision_score)
-        }
+        return [
+            {
+                "is_anomaly": bool(score < 0),  # Convert numpy.bool_ to Python bool
+                "confidence": float(abs(score)),
+                "score": float(score)
+            }
+            for score in decision_scores
+        ]
         
     except Exception as e:
         print(f"❌ Error in anomaly prediction: {e}")
-        return {"is_anomaly": False, "confidence": 0.0, "score": 0.0}
+        return [dict(default) for _ in requests]
+
+def predict_anomaly(speed_kmh: float, in_geofence: int, lat: float = None, lon: float = None) -> dict:
+    """Enhanced anomaly prediction with confidence scoring"""
+    return predict_anomaly_batch([(speed_kmh, in_geofence, lat, lon)])[0]
+
+class AsyncBatcher:
+    """Collect concurrent prediction requests and score them together in one model call"""
+    
+    def __init__(self, max_batch: int = 128, max_wait_ms: int = 5):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = None
+        self.task = None
+    
+    async def submit(self, speed_kmh: float, in_geofence: int, lat: float = None, lon: float = None) -> dict:
+        """Queue one prediction request and wait for its result"""
+        if self.task is None or self.task.done():
+            # Batcher not running (e.g. outside the app lifespan), score this request on its own
+            return await asyncio.to_thread(predict_anomaly, speed_kmh, in_geofence, lat, lon)
+        
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(((speed_kmh, in_geofence, lat, lon), future))
+        return await future
+    
+    async def run(self):
+        """Pull up to max_batch requests (waiting at most max_wait) and score them until stopped"""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:  # Stop sentinel
+                break
+            batch = [item]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    # Score what was already collected, then stop
+                    stopping = True
+                    break
+                batch.append(item)
+            
+            await self._score(batch)
+    
+    async def _score(self, batch: list):
+        """Score one batch in a worker thread and resolve (or fail) every waiting request"""
+        try:
+            results = await asyncio.to_thread(predict_anomaly_batch, [request for request, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+    
+    def start(self):
+        """Start the batching task on the running event loop"""
+        if self.task is None or self.task.done():
+            self.queue = asyncio.Queue()
+            self.task = asyncio.create_task(self.run())
+    
+    async def stop(self):
+        """Stop the batching task once its current batch is scored, then score anything still queued"""
+        if self.task is None:
+            return
+        if not self.task.done():
+            # A sentinel instead of cancel(): a batch already taken off the queue is never abandoned
+            await self.queue.put(None)
+            try:
+                await self.task
+            except Exception as e:
+                print(f"Error stopping prediction batcher: {e}")
+        self.task = None
+        
+        pending = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is not None:
+                pending.append(item)
+        if pending:
+            await self._score(pending)
+
+prediction_batcher = AsyncBatcher(ML_CONFIG["batch_size"], ML_CONFIG["batch_wait_ms"])
 
 def get_ml_status():
     """Get current ML model status"""
-    global last_training_time, auto_retrain_enabled, monitor_thread
+    global last_training_time, auto_retrain_enabled, _retrain_future
     
     return {
         "model_loaded": anomaly_model is not None,
         "scaler_loaded": scaler is not None,
         "last_training": last_training_time.isoformat() if last_training_time else None,
         "auto_retrain_enabled": auto_retrain_enabled,
-        "monitor_running": monitor_thread is not None and monitor_thread.is_alive(),
+        # Retraining is event-driven: the "monitor" is running whenever auto-retraining is enabled
+        "monitor_running": auto_retrain_enabled,
+        "retrain_pending": _retrain_future is not None and not _retrain_future.done(),
         "model_file_exists": os.path.exists(MODEL_FILE),
         "scaler_file_exists": os.path.exists(SCALER_FILE)
     }
\ No newline at end of file
@@ -1,6 +1,9 @@
 # SafeHorizon API - Data Models
+from dataclasses import dataclass
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse
+import orjson
 import math
 
 class TouristRegistration(BaseModel):
@@ -28,31 +31,46 @@ class GeofenceData(BaseModel):
     polygon: List[List[float]]  # Array of [lat, lon] coordinates
     severity: str = Field(..., pattern="^(LOW|MEDIUM|HIGH)$")
 
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered by orjson (dataclasses and NumPy scalars serialize natively when returned directly;
+    plain dict returns go through FastAPI's jsonable_encoder first, so they must hold plain Python values)"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
 # Response Models
+# Responses built by the server itself are plain slotted dataclasses: no per-field validation
 class TouristResponse(BaseModel):
     tourist_id: str
 
-class MLAnalysis(BaseModel):
+@dataclass(slots=True, frozen=True)
+class MLAnalysis:
     anomaly_detected: bool
     confidence: float
     score: float
 
-class LocationResponse(BaseModel):
+@dataclass(slots=True, frozen=True)
+class LocationResponse:
     status: str
     alert_created: bool
     ml_analysis: Optional[MLAnalysis] = None
 
-class AlertResponse(BaseModel):
+@dataclass(slots=True, frozen=True)
+class AlertResponse:
     alert_id: str
     status: str
 
-class MLStatusResponse(BaseModel):
+@dataclass(slots=True, frozen=True)
+class MLStatusResponse:
     model_loaded: bool
     auto_retrain_enabled: bool
     monitor_running: bool
+    retrain_pending: bool  # A background retrain has been submitted and has not finished yet
     last_training: Optional[str] = None
 
 # Comprehensive Tourist Information Models
+# Nested inside the Pydantic models below, so these stay BaseModel rather than dataclasses
 class LocationInfo(BaseModel):
     id: str
     lat: float
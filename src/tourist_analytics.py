@@ -1,11 +1,20 @@
 # SafeHorizon API - Tourist Analytics Helper Functions
 import pandas as pd
+import numpy as np
 import math
+import threading
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
-from src.database import read_csv_safe
+from typing import Dict, List, Optional, Any, Tuple
+from src.database import (
+    read_csv_safe, read_csv_derived, read_csv_grouped, read_rows_where, append_to_csv, optional_text
+)
 from config.settings import CSV_FILES
 
+EARTH_RADIUS_KM = 6371
+
+# Consecutive points closer than this (~11 km) are measured with the equirectangular approximation
+SHORT_SEGMENT_RADIANS = math.radians(0.1)
+
 def calculate_distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Calculate distance between two coordinates using Haversine formula"""
     if pd.isna(lat1) or pd.isna(lon1) or pd.isna(lat2) or pd.isna(lon2):
@@ -20,90 +29,165 @@ def calculate_distance_km(lat1: float, lon1: float, lat2: float, lon2: float) ->
     a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
     c = 2 * math.asin(math.sqrt(a))
     
-    # Radius of earth in kilometers
-    r = 6371
-    return c * r
+    return c * EARTH_RADIUS_KM
+
+def _haversine_rad(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Central angles (radians) between arrays of points given in radians, by the Haversine formula"""
+    a = np.sin((lat2 - lat1)/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1)/2)**2
+    return 2 * np.arcsin(np.sqrt(a))
+
+def _segment_radians(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Central angle of each consecutive segment of a time-ordered trajectory given in radians"""
+    dlat = np.diff(lat)
+    dlon = np.diff(lon)
+    
+    # Equirectangular approximation: one cos and one sqrt per segment, sub-meter error for short hops
+    x = dlon * np.cos((lat[:-1] + lat[1:]) / 2)
+    segments = np.sqrt(x*x + dlat*dlat)
+    
+    # Long jumps (or ones crossing the antimeridian) still use the full Haversine formula
+    long_hops = np.flatnonzero(segments > SHORT_SEGMENT_RADIANS)
+    if len(long_hops) > 0:
+        segments[long_hops] = _haversine_rad(lat[long_hops], lon[long_hops], lat[long_hops + 1], lon[long_hops + 1])
+    return segments
+
+def _in_time_order(locations_df: pd.DataFrame) -> pd.DataFrame:
+    """Locations ordered by timestamp, sorting only if they are not already (rows are stored chronologically)"""
+    if locations_df['timestamp'].is_monotonic_increasing:
+        return locations_df
+    return locations_df.sort_values('timestamp')
 
 def calculate_total_distance(locations_df: pd.DataFrame) -> float:
     """Calculate total distance traveled by tourist"""
     if len(locations_df) < 2:
         return 0.0
     
-    total_distance = 0.0
-    locations_df = locations_df.sort_values('timestamp')
+    locations_df = _in_time_order(locations_df)
+    lat = np.radians(locations_df['lat'].to_numpy(dtype=float))
+    lon = np.radians(locations_df['lon'].to_numpy(dtype=float))
     
-    for i in range(1, len(locations_df)):
-        prev_loc = locations_df.iloc[i-1]
-        curr_loc = locations_df.iloc[i]
-        
-        distance = calculate_distance_km(
-            prev_loc['lat'], prev_loc['lon'],
-            curr_loc['lat'], curr_loc['lon']
-        )
-        total_distance += distance
+    # Segments with a missing coordinate are NaN and count as 0 km, as in calculate_distance_km
+    total_distance = EARTH_RADIUS_KM * np.nansum(_segment_radians(lat, lon))
+    return round(float(total_distance), 2)
+
+# Risk factor weights: alerts, anomalies, speed, geofence, activity
+_RISK_WEIGHTS = np.array([0.3, 0.25, 0.2, 0.15, 0.1], dtype=np.float64)
+
+def _weighted_risk(risk_factors: np.ndarray) -> np.ndarray:
+    """Weighted sum over the last axis of one tourist's risk factors or a (n_tourists, 5) matrix of them"""
+    # Multiply-then-sum adds the terms in the same order for a single row and for every row of a batch
+    return np.multiply(risk_factors, _RISK_WEIGHTS[:risk_factors.shape[-1]]).sum(axis=-1)
+
+# Trailing UTC offset on an ISO timestamp ("Z", "+05:30", "+0530")
+_TZ_SUFFIX = r'(?:Z|[+-]\d{2}:?\d{2})$'
+
+def _parse_iso(timestamps: pd.Series, utc: bool = False) -> pd.Series:
+    """pd.to_datetime over ISO strings, falling back to one value at a time if the batch cannot be parsed together"""
+    try:
+        return pd.to_datetime(timestamps, format='ISO8601', errors='coerce', utc=utc)
+    except (ValueError, TypeError):
+        return pd.Series([pd.to_datetime(value, format='ISO8601', errors='coerce', utc=utc) for value in timestamps],
+                         index=timestamps.index, dtype='datetime64[ns, UTC]' if utc else 'datetime64[ns]')
+
+def parse_timestamps(timestamps: pd.Series) -> np.ndarray:
+    """Parse stored ISO timestamp strings (naive local time) into a datetime64[ns] array, NaT if missing"""
+    timestamps = pd.Series(timestamps, dtype=object)
+    aware = timestamps.str.contains(_TZ_SUFFIX, na=False).to_numpy(dtype=bool)
+    if not aware.any():
+        return _parse_iso(timestamps).to_numpy(dtype='datetime64[ns]')
     
-    return round(total_distance, 2)
+    # A few rows carry a UTC offset: convert those to naive local time like the rest, instead of failing the batch
+    parsed = _parse_iso(timestamps.where(~aware)).to_numpy(dtype='datetime64[ns]')
+    local_tz = datetime.now().astimezone().tzinfo
+    parsed[aware] = (_parse_iso(timestamps[aware], utc=True).dt.tz_convert(local_tz).dt.tz_localize(None)
+                     .to_numpy(dtype='datetime64[ns]'))
+    return parsed
+
+def hours_since(timestamps: np.ndarray) -> float:
+    """Hours between now and the latest of the parsed timestamps (NaN if there are none)"""
+    timestamps = timestamps[~np.isnat(timestamps)]
+    if len(timestamps) == 0:
+        return float('nan')
+    return float((np.datetime64(datetime.now(), 'ns') - timestamps.max()) / np.timedelta64(1, 'h'))
 
-def calculate_risk_score(tourist_id: str, locations_df: pd.DataFrame, alerts_df: pd.DataFrame) -> float:
+def _equals(column: pd.Series, value: str) -> np.ndarray:
+    """Boolean array of column == value, comparing integer codes when the column is categorical"""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        code = column.cat.categories.get_indexer([value])[0]
+        if code < 0:  # Value not among the categories (code -1 marks missing values)
+            return np.zeros(len(column), dtype=bool)
+        return column.cat.codes.to_numpy() == code
+    return (column == value).to_numpy(dtype=bool)
+
+def calculate_speed_risk(avg_speed):
+    """Branch-free speed risk (0-1) for one average speed or an array of them; unknown speed is no risk"""
+    # High speed scales 80-120 km/h to 0-1, very low speed scales 5-0 km/h to 0-1; at most one term is non-zero
+    high_speed_risk = np.clip((avg_speed - 80) / 40, 0.0, 1.0)
+    low_speed_risk = np.clip((5 - avg_speed) / 5, 0.0, 1.0)
+    return np.nan_to_num(high_speed_risk + low_speed_risk)
+
+def calculate_risk_score(tourist_id: str, locations_df: pd.DataFrame, alerts_df: pd.DataFrame,
+                         timestamps: Optional[np.ndarray] = None) -> float:
     """Calculate risk score for tourist based on various factors"""
     if len(locations_df) == 0:
         return 0.5  # Unknown risk
     
+    # Materialize the needed columns once and derive every factor from these arrays
+    n_locations = len(locations_df)
+    anomalies = _equals(locations_df['label'], 'anomaly')
+    speeds = locations_df['speed_kmh'].to_numpy(dtype=float)
+    in_geofence = locations_df['in_geofence'].to_numpy()
+    n_alerts = int((alerts_df['tourist_id'].to_numpy() == tourist_id).sum())
+    
+    # Speed risk averages only known speeds like Series.mean()
+    known_speeds = speeds[~np.isnan(speeds)]
+    avg_speed = known_speeds.mean() if len(known_speeds) > 0 else np.nan
+    
+    if timestamps is None:
+        timestamps = parse_timestamps(locations_df['timestamp'])
+    
+    return _risk_from_totals(n_locations, n_alerts, int(np.count_nonzero(anomalies)), avg_speed,
+                             int((in_geofence == 0).sum()), hours_since(timestamps))
+
+def _risk_from_totals(n_locations: int, n_alerts: int, anomaly_count: int, avg_speed: float,
+                      violation_count: int, hours_since_last: float) -> float:
+    """Risk score from a tourist's location and alert counts (n_locations > 0)"""
     risk_factors = []
     
     # 1. Alert frequency (0-1 scale)
-    tourist_alerts = alerts_df[alerts_df['tourist_id'] == tourist_id]
-    alert_ratio = len(tourist_alerts) / max(len(locations_df), 1)
+    alert_ratio = n_alerts / n_locations
     risk_factors.append(min(alert_ratio * 2, 1.0))  # Scale to 0-1
     
     # 2. Anomaly frequency (0-1 scale)
-    anomaly_locations = locations_df[locations_df['label'] == 'anomaly']
-    anomaly_ratio = len(anomaly_locations) / len(locations_df)
-    risk_factors.append(anomaly_ratio)
+    risk_factors.append(anomaly_count / n_locations)
     
     # 3. Speed risk (0-1 scale)
-    avg_speed = locations_df['speed_kmh'].mean()
-    if avg_speed > 80:  # High speed risk
-        speed_risk = min((avg_speed - 80) / 40, 1.0)  # Scale 80-120 to 0-1
-    elif avg_speed < 5:  # Very low speed risk
-        speed_risk = min((5 - avg_speed) / 5, 1.0)
-    else:
-        speed_risk = 0.0
-    risk_factors.append(speed_risk)
+    risk_factors.append(float(calculate_speed_risk(avg_speed)))
     
     # 4. Geofence violations (0-1 scale)
-    geofence_violations = len(locations_df[locations_df['in_geofence'] == 0])
-    violation_ratio = geofence_violations / len(locations_df)
-    risk_factors.append(violation_ratio)
+    risk_factors.append(violation_count / n_locations)
     
     # 5. Recent activity (0-1 scale)
-    if len(locations_df) > 0:
-        latest_timestamp = pd.to_datetime(locations_df['timestamp'].max())
-        hours_since_last = (datetime.now() - latest_timestamp).total_seconds() / 3600
-        if hours_since_last > 24:  # More than 24 hours
-            inactivity_risk = min(hours_since_last / 48, 1.0)  # Scale 24-72 hours to 0-1
-        else:
-            inactivity_risk = 0.0
-        risk_factors.append(inactivity_risk)
+    if hours_since_last > 24:  # More than 24 hours
+        inactivity_risk = min(hours_since_last / 48, 1.0)  # Scale 24-72 hours to 0-1
     else:
-        risk_factors.append(1.0)  # No data is high risk
+        inactivity_risk = 0.0
+    risk_factors.append(inactivity_risk)
     
     # Calculate weighted average
-    weights = [0.3, 0.25, 0.2, 0.15, 0.1]  # Alerts, anomalies, speed, geofence, activity
-    weighted_risk = sum(rf * w for rf, w in zip(risk_factors, weights))
+    weighted_risk = float(_weighted_risk(np.array(risk_factors, dtype=np.float64)))
     
     return round(min(max(weighted_risk, 0.0), 1.0), 3)
 
-def determine_safety_status(risk_score: float, active_alerts: int, hours_since_last: float) -> str:
+def determine_safety_status(risk_score: float, active_alerts: int, hours_since_last: float,
+                            alerts_df: Optional[pd.DataFrame] = None) -> str:
     """Determine overall safety status"""
     if active_alerts > 0:
         # Check for emergency alerts
-        alerts_df = read_csv_safe(CSV_FILES["alerts"])
-        emergency_alerts = alerts_df[
-            (alerts_df['type'] == 'SOS') & 
-            (alerts_df['status'] == 'OPEN')
-        ]
-        if len(emergency_alerts) > 0:
+        if alerts_df is None:
+            alerts_df = read_csv_safe(CSV_FILES["alerts"])
+        emergency_alerts = _equals(alerts_df['type'], 'SOS') & _equals(alerts_df['status'], 'OPEN')
+        if emergency_alerts.any():
             return "EMERGENCY"
         else:
             return "AT_RISK"
@@ -117,80 +201,217 @@ def determine_safety_status(risk_score: float, active_alerts: int, hours_since_l
     else:
         return "SAFE"
 
+def _tourist_rows(df: pd.DataFrame, rows_by_tourist: Dict[Any, np.ndarray], tourist_id: str) -> pd.DataFrame:
+    """Select one tourist's rows using the table's cached tourist_id -> row positions index"""
+    return df.iloc[rows_by_tourist.get(tourist_id, np.empty(0, dtype=np.intp))]
+
+def _trajectory_arrays(locations_df: pd.DataFrame) -> Dict[str, Any]:
+    """Row positions per tourist plus the column arrays analytics scan (cached with the locations table)"""
+    return {
+        "rows": locations_df.groupby('tourist_id', sort=False).indices,
+        "lat": locations_df['lat'].to_numpy(dtype=float),
+        "lon": locations_df['lon'].to_numpy(dtype=float),
+        "speed": locations_df['speed_kmh'].to_numpy(dtype=float),
+        "anomaly": _equals(locations_df['label'], 'anomaly'),
+        "violation": (locations_df['in_geofence'] == 0).to_numpy(dtype=bool),
+        "timestamp": locations_df['timestamp'].to_numpy(dtype=object),
+        "time": parse_timestamps(locations_df['timestamp'])
+    }
+
+def _trajectories() -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Return (locations table, trajectory arrays), the arrays cached until the table changes"""
+    return read_csv_derived(CSV_FILES["locations"], "trajectories", _trajectory_arrays)
+
+def _load_tourist_data(tourist_id: str):
+    """Load a tourist's locations (with parsed timestamps) and alerts, plus the whole alerts table"""
+    try:
+        locations_df, trajectories = _trajectories()
+        location_rows, times = trajectories["rows"], trajectories["time"]
+    except Exception as e:
+        print(f"Error reading {CSV_FILES['locations']}: {e}")
+        locations_df, location_rows, times = pd.DataFrame(), {}, np.empty(0, dtype='datetime64[ns]')
+    alerts_df, alert_rows = read_csv_grouped(CSV_FILES["alerts"], "tourist_id")
+    
+    rows = location_rows.get(tourist_id, np.empty(0, dtype=np.intp))
+    tourist_alerts = _tourist_rows(alerts_df, alert_rows, tourist_id)
+    return locations_df.iloc[rows], times[rows], tourist_alerts, alerts_df
+
+# Running per-tourist location aggregates, loaded at startup and updated as locations are stored
+# (None until loaded, in which case analytics fall back to scanning the locations table)
+_aggregates: Optional[Dict[str, Dict[str, Any]]] = None
+_aggregates_lock = threading.Lock()
+
+def _empty_aggregate() -> Dict[str, Any]:
+    """Aggregates for a tourist with no stored locations"""
+    return {
+        "count": 0,
+        "anomaly_count": 0,
+        "geofence_violations": 0,
+        "speed_sum": 0.0,
+        "max_speed": -np.inf,
+        "min_speed": np.inf,
+        "known_speed_sum": 0.0,
+        "known_speed_count": 0,
+        "distance_km": 0.0,
+        "first_timestamp": None,
+        "last_timestamp": None,
+        "latest_time": np.datetime64('NaT', 'ns'),
+        "last_lat": np.nan,
+        "last_lon": np.nan,
+        "stale": False,
+        "seq": 0  # Locations stored for the tourist since the aggregates were loaded
+    }
+
+def _trajectory_stats(trajectories: Dict[str, Any], rows: np.ndarray) -> Dict[str, Any]:
+    """Build a tourist's aggregates in one pass over their trajectory arrays (rows: their table positions)"""
+    aggregate = _empty_aggregate()
+    if len(rows) == 0:
+        return aggregate
+    
+    # Rows are stored chronologically; only reorder (stably, missing times last) if they are not
+    times = trajectories["time"][rows]
+    if len(rows) > 1 and (np.diff(times.view(np.int64)) < 0).any():
+        order = np.argsort(times, kind='stable')
+        rows, times = rows[order], times[order]
+    
+    speeds = trajectories["speed"][rows]
+    known = ~np.isnan(speeds)
+    filled_speeds = np.where(known, speeds, 0.0)  # Missing speeds count as 0
+    lat = trajectories["lat"][rows]
+    lon = trajectories["lon"][rows]
+    has_time = ~np.isnat(times)
+    timed = rows[has_time]
+    
+    aggregate.update({
+        "count": len(rows),
+        "anomaly_count": int(np.count_nonzero(trajectories["anomaly"][rows])),
+        "geofence_violations": int(np.count_nonzero(trajectories["violation"][rows])),
+        "speed_sum": float(filled_speeds.sum()),
+        "max_speed": float(filled_speeds.max()),
+        "min_speed": float(filled_speeds.min()),
+        "known_speed_sum": float(speeds[known].sum()),
+        "known_speed_count": int(np.count_nonzero(known)),
+        "distance_km": float(EARTH_RADIUS_KM * np.nansum(_segment_radians(np.radians(lat), np.radians(lon)))),
+        "first_timestamp": trajectories["timestamp"][timed[0]] if len(timed) > 0 else None,
+        "last_timestamp": trajectories["timestamp"][timed[-1]] if len(timed) > 0 else None,
+        "latest_time": times[has_time][-1] if len(timed) > 0 else aggregate["latest_time"],
+        "last_lat": float(lat[-1]),
+        "last_lon": float(lon[-1])
+    })
+    return aggregate
+
+def _tourist_trajectory_stats(tourist_id: str) -> Dict[str, Any]:
+    """Build one tourist's aggregates from the stored locations"""
+    _, trajectories = _trajectories()
+    return _trajectory_stats(trajectories, trajectories["rows"].get(tourist_id, np.empty(0, dtype=np.intp)))
+
+def load_tourist_aggregates():
+    """Initialize every tourist's running aggregates from the stored locations"""
+    global _aggregates
+    
+    try:
+        _, trajectories = _trajectories()
+        aggregates = {
+            tourist_id: _trajectory_stats(trajectories, rows)
+            for tourist_id, rows in trajectories["rows"].items()
+        }
+        with _aggregates_lock:
+            _aggregates = aggregates
+    except Exception as e:
+        print(f"Error loading tourist aggregates: {e}")
+
+def store_location(location_data: dict) -> bool:
+    """Queue a location row and fold it into its tourist's aggregates as one step"""
+    # Holding the lock across both keeps every stored row counted exactly once, even by a concurrent rebuild
+    with _aggregates_lock:
+        if not append_to_csv(CSV_FILES["locations"], location_data):
+            return False
+        _fold_location(location_data)
+    return True
+
+def _fold_location(location_data: dict):
+    """Fold a newly stored location into its tourist's running aggregates (call with the lock held)"""
+    timestamp = location_data["timestamp"]
+    speed = location_data.get("speed_kmh")
+    speed = np.nan if speed is None or pd.isna(speed) else float(speed)
+    lat, lon = float(location_data["lat"]), float(location_data["lon"])
+    
+    if _aggregates is None:
+        return
+    aggregate = _aggregates.setdefault(location_data["tourist_id"], _empty_aggregate())
+    aggregate["seq"] += 1
+    if aggregate["stale"]:
+        return
+    if aggregate["last_timestamp"] is not None and timestamp < aggregate["last_timestamp"]:
+        # Arrived out of order: the distance depends on order, so rebuild from the table on next read
+        aggregate["stale"] = True
+        return
+    
+    if aggregate["count"] > 0:
+        segment = _segment_radians(np.radians([aggregate["last_lat"], lat]), np.radians([aggregate["last_lon"], lon]))
+        aggregate["distance_km"] += float(EARTH_RADIUS_KM * np.nansum(segment))
+    
+    filled_speed = 0.0 if np.isnan(speed) else speed
+    aggregate["count"] += 1
+    aggregate["anomaly_count"] += int(location_data.get("label") == 'anomaly')
+    aggregate["geofence_violations"] += int(location_data.get("in_geofence") == 0)
+    aggregate["speed_sum"] += filled_speed
+    aggregate["max_speed"] = max(aggregate["max_speed"], filled_speed)
+    aggregate["min_speed"] = min(aggregate["min_speed"], filled_speed)
+    if not np.isnan(speed):
+        aggregate["known_speed_sum"] += speed
+        aggregate["known_speed_count"] += 1
+    if aggregate["first_timestamp"] is None:
+        aggregate["first_timestamp"] = timestamp
+    aggregate["last_timestamp"] = timestamp
+    aggregate["latest_time"] = np.fmax(aggregate["latest_time"], np.datetime64(timestamp, 'ns'))
+    aggregate["last_lat"], aggregate["last_lon"] = lat, lon
+
+def _tourist_aggregate(tourist_id: str) -> Optional[Dict[str, Any]]:
+    """Snapshot of a tourist's running aggregates (None if they are not loaded), rebuilt first if stale"""
+    for _ in range(3):
+        with _aggregates_lock:
+            if _aggregates is None:
+                return None
+            aggregate = _aggregates.get(tourist_id)
+            if aggregate is None:
+                return _empty_aggregate()
+            if not aggregate["stale"]:
+                return dict(aggregate)
+            seq = aggregate["seq"]
+        
+        # Rebuild from the table without the lock, so stores are not held up by the read; keep the
+        # result only if no location was stored for the tourist meanwhile (it may or may not be in the read)
+        rebuilt = _tourist_trajectory_stats(tourist_id)
+        with _aggregates_lock:
+            if _aggregates.get(tourist_id) is aggregate and aggregate["seq"] == seq:
+                rebuilt["seq"] = seq
+                _aggregates[tourist_id] = rebuilt
+                return dict(rebuilt)
+    
+    # Locations keep arriving for this tourist: rebuild with stores held off
+    with _aggregates_lock:
+        if _aggregates is None:
+            return None
+        aggregate = _aggregates.get(tourist_id)
+        if aggregate is None:
+            return _empty_aggregate()
+        if aggregate["stale"]:
+            rebuilt = _tourist_trajectory_stats(tourist_id)
+            rebuilt["seq"] = aggregate["seq"]
+            aggregate = _aggregates[tourist_id] = rebuilt
+        return dict(aggregate)
+
 def get_tourist_analytics(tourist_id: str) -> Dict[str, Any]:
     """Calculate comprehensive analytics for a tourist"""
     try:
-        # Load data
-        locations_df = read_csv_safe(CSV_FILES["locations"])
-        alerts_df = read_csv_safe(CSV_FILES["alerts"])
-        
-        # Filter for specific tourist
-        tourist_locations = locations_df[locations_df['tourist_id'] == tourist_id]
-        tourist_alerts = alerts_df[alerts_df['tourist_id'] == tourist_id]
-        
-        if len(tourist_locations) == 0:
-            return {
-                "total_locations": 0,
-                "total_alerts": len(tourist_alerts),
-                "anomaly_locations": 0,
-                "normal_locations": 0,
-                "average_speed": 0.0,
-                "max_speed": 0.0,
-                "min_speed": 0.0,
-                "geofence_violations": 0,
-                "sos_alerts": 0,
-                "ml_alerts": 0,
-                "first_location": None,
-                "last_location": None,
-                "total_distance_km": 0.0,
-                "risk_score": 0.5
-            }
-        
-        # Basic statistics
-        total_locations = len(tourist_locations)
-        anomaly_locations = len(tourist_locations[tourist_locations['label'] == 'anomaly'])
-        normal_locations = total_locations - anomaly_locations
-        
-        # Speed statistics
-        speeds = tourist_locations['speed_kmh'].fillna(0)
-        avg_speed = round(speeds.mean(), 2)
-        max_speed = round(speeds.max(), 2)
-        min_speed = round(speeds.min(), 2)
-        
-        # Location statistics
-        geofence_violations = len(tourist_locations[tourist_locations['in_geofence'] == 0])
-        
-        # Alert statistics
-        sos_alerts = len(tourist_alerts[tourist_alerts['type'] == 'SOS'])
-        ml_alerts = len(tourist_alerts[tourist_alerts['type'] == 'ML'])
-        
-        # Time statistics
-        tourist_locations_sorted = tourist_locations.sort_values('timestamp')
-        first_location = tourist_locations_sorted['timestamp'].iloc[0] if len(tourist_locations_sorted) > 0 else None
-        last_location = tourist_locations_sorted['timestamp'].iloc[-1] if len(tourist_locations_sorted) > 0 else None
-        
-        # Distance calculation
-        total_distance = calculate_total_distance(tourist_locations)
-        
-        # Risk score
-        risk_score = calculate_risk_score(tourist_id, tourist_locations, tourist_alerts)
-        
-        return {
-            "total_locations": total_locations,
-            "total_alerts": len(tourist_alerts),
-            "anomaly_locations": anomaly_locations,
-            "normal_locations": normal_locations,
-            "average_speed": avg_speed,
-            "max_speed": max_speed,
-            "min_speed": min_speed,
-            "geofence_violations": geofence_violations,
-            "sos_alerts": sos_alerts,
-            "ml_alerts": ml_alerts,
-            "first_location": first_location,
-            "last_location": last_location,
-            "total_distance_km": total_distance,
-            "risk_score": risk_score
-        }
+        aggregate = _tourist_aggregate(tourist_id)
+        if aggregate is None:
+            # Aggregates not loaded (e.g. outside the API): scan the tourist's locations
+            aggregate = _tourist_trajectory_stats(tourist_id)
+        alerts_df, alert_rows = read_csv_grouped(CSV_FILES["alerts"], "tourist_id")
+        tourist_alerts = _tourist_rows(alerts_df, alert_rows, tourist_id)
+        return _analytics_from_aggregate(aggregate, tourist_alerts)
         
     except Exception as e:
         print(f"Error calculating tourist analytics: {e}")
@@ -211,17 +432,63 @@ def get_tourist_analytics(tourist_id: str) -> Dict[str, Any]:
             "risk_score": 0.5
         }
 
+def _analytics_from_aggregate(aggregate: Dict[str, Any], tourist_alerts: pd.DataFrame) -> Dict[str, Any]:
+    """Calculate a tourist's analytics from their location aggregates and their alerts"""
+    total_locations = aggregate["count"]
+    
+    # Alert statistics
+    sos_alerts = int(np.count_nonzero(_equals(tourist_alerts['type'], 'SOS')))
+    ml_alerts = int(np.count_nonzero(_equals(tourist_alerts['type'], 'ML')))
+    
+    if total_locations == 0:
+        return {
+            "total_locations": 0,
+            "total_alerts": len(tourist_alerts),
+            "anomaly_locations": 0,
+            "normal_locations": 0,
+            "average_speed": 0.0,
+            "max_speed": 0.0,
+            "min_speed": 0.0,
+            "geofence_violations": 0,
+            "sos_alerts": 0,
+            "ml_alerts": 0,
+            "first_location": None,
+            "last_location": None,
+            "total_distance_km": 0.0,
+            "risk_score": 0.5
+        }
+    
+    # Risk score (speed risk averages only known speeds)
+    known_speed_count = aggregate["known_speed_count"]
+    avg_known_speed = aggregate["known_speed_sum"] / known_speed_count if known_speed_count > 0 else np.nan
+    risk_score = _risk_from_totals(
+        total_locations, len(tourist_alerts), aggregate["anomaly_count"], avg_known_speed,
+        aggregate["geofence_violations"], hours_since(np.array([aggregate["latest_time"]]))
+    )
+    
+    return {
+        "total_locations": total_locations,
+        "total_alerts": len(tourist_alerts),
+        "anomaly_locations": aggregate["anomaly_count"],
+        "normal_locations": total_locations - aggregate["anomaly_count"],
+        "average_speed": round(aggregate["speed_sum"] / total_locations, 2),
+        "max_speed": round(aggregate["max_speed"], 2),
+        "min_speed": round(aggregate["min_speed"], 2),
+        "geofence_violations": aggregate["geofence_violations"],
+        "sos_alerts": sos_alerts,
+        "ml_alerts": ml_alerts,
+        "first_location": aggregate["first_timestamp"],
+        "last_location": aggregate["last_timestamp"],
+        "total_distance_km": round(aggregate["distance_km"], 2),
+        "risk_score": risk_score
+    }
+
 def get_safety_status(tourist_id: str) -> Dict[str, Any]:
     """Get current safety status for tourist"""
     try:
-        locations_df = read_csv_safe(CSV_FILES["locations"])
-        alerts_df = read_csv_safe(CSV_FILES["alerts"])
-        tourists_df = read_csv_safe(CSV_FILES["tourists"])
-        
         # Get tourist locations and alerts
-        tourist_locations = locations_df[locations_df['tourist_id'] == tourist_id]
-        tourist_alerts = alerts_df[alerts_df['tourist_id'] == tourist_id]
-        tourist_info = tourists_df[tourists_df['id'] == tourist_id]
+        tourist_locations, tourist_times, tourist_alerts, alerts_df = _load_tourist_data(tourist_id)
+        tourist_info = read_rows_where(CSV_FILES["tourists"], "id", tourist_id)
         
         # Calculate time since last seen
         last_seen = None
@@ -229,38 +496,41 @@ def get_safety_status(tourist_id: str) -> Dict[str, Any]:
         current_location = None
         
         if len(tourist_locations) > 0:
-            tourist_locations_sorted = tourist_locations.sort_values('timestamp')
-            last_location = tourist_locations_sorted.iloc[-1]
-            last_seen = last_location['timestamp']
-            
-            last_timestamp = pd.to_datetime(last_seen)
-            hours_since_last = (datetime.now() - last_timestamp).total_seconds() / 3600
+            # Latest row by parsed timestamp (skipping missing ones), no sort needed; rows are stored in
+            # time order, so with no usable timestamp at all the last stored row is the latest
+            timed = np.flatnonzero(~np.isnat(tourist_times))
+            latest = timed[np.argmax(tourist_times[timed])] if len(timed) > 0 else len(tourist_locations) - 1
+            last_location = tourist_locations.iloc[latest]
+            last_seen = optional_text(last_location['timestamp'])
+            hours_since_last = hours_since(tourist_times)
             
+            # Plain Python values (not NumPy scalars) so the dict serializes as-is in any response
             current_location = {
-                "id": last_location['id'],
-                "lat": last_location['lat'],
-                "lon": last_location['lon'],
-                "timestamp": last_location['timestamp'],
-                "speed_kmh": last_location['speed_kmh'],
-                "in_geofence": last_location['in_geofence'],
-                "label": last_location['label']
+                "id": str(last_location['id']),
+                "lat": float(last_location['lat']),
+                "lon": float(last_location['lon']),
+                "timestamp": last_seen or "",
+                "speed_kmh": float(last_location['speed_kmh']),
+                "in_geofence": int(last_location['in_geofence']),
+                "label": str(last_location['label'])
             }
         
         # Count active alerts
-        active_alerts = len(tourist_alerts[tourist_alerts['status'] == 'OPEN'])
+        active_alerts = int(np.count_nonzero(_equals(tourist_alerts['status'], 'OPEN')))
         
         # Calculate days since registration
         days_since_registration = 0
         if len(tourist_info) > 0:
-            reg_date = pd.to_datetime(tourist_info.iloc[0]['trip_start'])
-            days_since_registration = (datetime.now() - reg_date).days
+            # Parsed like location timestamps, so a trip start with a UTC offset ("...Z") is compared in local time
+            reg_date = parse_timestamps(tourist_info['trip_start'].iloc[:1])[0]
+            if not np.isnat(reg_date):
+                days_since_registration = int((np.datetime64(datetime.now(), 'ns') - reg_date) // np.timedelta64(1, 'D'))
         
-        # Calculate risk score for status determination
-        analytics = get_tourist_analytics(tourist_id)
-        risk_score = analytics['risk_score']
+        # Calculate risk score for status determination (only the risk score, no distance or other analytics)
+        risk_score = calculate_risk_score(tourist_id, tourist_locations, tourist_alerts, tourist_times)
         
         # Determine status
-        status = determine_safety_status(risk_score, active_alerts, hours_since_last)
+        status = determine_safety_status(risk_score, active_alerts, hours_since_last, alerts_df)
         
         return {
             "current_status": status,
@@ -278,4 +548,77 @@ def get_safety_status(tourist_id: str) -> Dict[str, Any]:
             "current_location": None,
             "active_alerts": 0,
             "days_since_registration": 0
-        }
\ No newline at end of file
+        }
+
+def summarize_all_tourists(tourist_ids: List[str]) -> pd.DataFrame:
+    """Activity totals, risk score and safety status for every tourist, computed with groupby aggregates"""
+    locations_df, trajectories = _trajectories()
+    times = trajectories["time"]
+    alerts_df = read_csv_safe(CSV_FILES["alerts"])
+    
+    # Per-tourist location aggregates, one groupby over the whole table
+    location_stats = pd.DataFrame({
+        'tourist_id': locations_df['tourist_id'],
+        'anomaly': trajectories["anomaly"],
+        'speed_kmh': trajectories["speed"],
+        'violation': trajectories["violation"],
+        'time': times,
+        'timestamp': locations_df['timestamp']
+    }).groupby('tourist_id', sort=False).agg(
+        total_locations=('anomaly', 'size'),
+        anomaly_ratio=('anomaly', 'mean'),
+        avg_speed=('speed_kmh', 'mean'),
+        violation_ratio=('violation', 'mean'),
+        latest=('time', 'max'),
+        last_seen=('timestamp', 'max')
+    )
+    
+    # Per-tourist alert aggregates
+    alert_stats = pd.DataFrame({
+        'tourist_id': alerts_df['tourist_id'],
+        'open': _equals(alerts_df['status'], 'OPEN')
+    }).groupby('tourist_id', sort=False).agg(total_alerts=('open', 'size'), active_alerts=('open', 'sum'))
+    
+    stats = pd.DataFrame(index=pd.Index(tourist_ids, name='tourist_id')).join(location_stats).join(alert_stats)
+    n_locations = stats['total_locations'].fillna(0).to_numpy(dtype=np.int64)
+    n_alerts = stats['total_alerts'].fillna(0).to_numpy(dtype=np.int64)
+    active_alerts = stats['active_alerts'].fillna(0).to_numpy(dtype=np.int64)
+    has_locations = n_locations > 0
+    
+    # Hours since each tourist's latest location (999 if they never sent one, as in get_safety_status)
+    latest = stats['latest'].to_numpy(dtype='datetime64[ns]')
+    hours_since_last = (np.datetime64(datetime.now(), 'ns') - latest) / np.timedelta64(1, 'h')
+    hours_since_last = np.where(has_locations, hours_since_last, 999)
+    
+    # Same five factors as calculate_risk_score, one row per tourist
+    with np.errstate(divide='ignore', invalid='ignore'):
+        alert_risk = np.minimum(n_alerts / n_locations * 2, 1.0)
+    inactivity_risk = np.where(hours_since_last > 24, np.minimum(hours_since_last / 48, 1.0), 0.0)
+    risk_factors = np.column_stack([
+        alert_risk,
+        stats['anomaly_ratio'].to_numpy(dtype=float),
+        calculate_speed_risk(stats['avg_speed'].to_numpy(dtype=float)),
+        stats['violation_ratio'].to_numpy(dtype=float),
+        inactivity_risk
+    ])
+    weighted_risk = np.clip(_weighted_risk(risk_factors), 0.0, 1.0)
+    risk_scores = [round(float(risk), 3) if known else 0.5 for risk, known in zip(weighted_risk, has_locations)]
+    
+    # Vectorized determine_safety_status
+    emergency = bool((_equals(alerts_df['type'], 'SOS') & _equals(alerts_df['status'], 'OPEN')).any())
+    risk_array = np.array(risk_scores)
+    current_status = np.select(
+        [(active_alerts > 0) & emergency, active_alerts > 0, hours_since_last > 48, risk_array > 0.7, risk_array > 0.4],
+        ["EMERGENCY", "AT_RISK", "UNKNOWN", "AT_RISK", "MODERATE_RISK"],
+        "SAFE"
+    )
+    
+    return pd.DataFrame({
+        'total_locations': n_locations,
+        'total_alerts': n_alerts,
+        'last_seen': pd.Series(
+            [None if pd.isna(value) else value for value in stats['last_seen']], index=stats.index, dtype=object
+        ),
+        'risk_score': risk_scores,
+        'current_status': current_status
+    }, index=stats.index)